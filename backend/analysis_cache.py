@@ -0,0 +1,168 @@
+"""
+Content-addressed cache for text analysis results.
+
+Results are keyed by a hash of the normalized text plus the model and rule
+versions that produced them. An in-memory LRU tier holds the hottest entries
+and an optional SQLite tier keeps results across restarts.
+
+The SQLite connection is opened on first use in each process, so gunicorn
+workers forked from a preloading master never share one, and every use of it
+goes through the cache lock.
+"""
+import copy
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from db import BUSY_TIMEOUT_MS
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text):
+    """
+    Normalize text for cache keys.
+
+    Both models are uncased and the rules match on lowercased text, so only
+    surrounding whitespace and case are folded.
+    """
+    return text.strip().lower()
+
+class AnalysisCache:
+    def __init__(self, namespace, max_size=10000, db_path=None):
+        """
+        Args:
+            namespace (str): Model and rule identifiers mixed into every key
+            max_size (int): Maximum number of results kept in memory
+            db_path (str): Optional SQLite file for the persistent tier
+        """
+        self.namespace = namespace
+        self.max_size = max_size
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._db_pid = None
+        self._db_failed = False
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _connection(self):
+        """Return this process's connection to the persistent tier, None if there isn't one"""
+        # caller holds the lock
+        if not self.db_path or self._db_failed:
+            return None
+        # a connection inherited over a fork belongs to the parent, leave it alone
+        if self._db is not None and self._db_pid == os.getpid():
+            return self._db
+
+        try:
+            db_dir = os.path.dirname(self.db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            # used from any thread, but only ever under self._lock
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS analysis_cache (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL
+                )
+            ''')
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Analysis cache database error, using memory only: {e}")
+            self._db_failed = True
+            self._db = None
+            return None
+
+        self._db = conn
+        self._db_pid = os.getpid()
+        return conn
+
+    def key(self, text):
+        """Hash the normalized text together with the cache namespace."""
+        payload = f"{self.namespace}\0{normalize_text(text)}"
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, text):
+        """Return a copy of the cached result for text, or None on a miss."""
+        key = self.key(text)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return copy.deepcopy(result)
+
+            db = self._connection()
+            if db is not None:
+                try:
+                    row = db.execute(
+                        "SELECT result FROM analysis_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                except Exception as e:
+                    logger.error(f"Analysis cache read error: {e}")
+                    row = None
+                if row:
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+                    self.disk_hits += 1
+                    return copy.deepcopy(result)
+
+            self.misses += 1
+            return None
+
+    def set(self, text, result):
+        """Store a result for text in both tiers."""
+        key = self.key(text)
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._remember(key, result)
+            db = self._connection()
+            if db is not None:
+                try:
+                    db.execute(
+                        "INSERT OR REPLACE INTO analysis_cache (key, result) VALUES (?, ?)",
+                        (key, json.dumps(result))
+                    )
+                    db.commit()
+                except Exception as e:
+                    logger.error(f"Analysis cache write error: {e}")
+
+    def _remember(self, key, result):
+        # caller holds the lock
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached result and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.memory_hits = self.disk_hits = self.misses = 0
+            db = self._connection()
+            if db is not None:
+                db.execute("DELETE FROM analysis_cache")
+                db.commit()
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                'hits': hits,
+                'memoryHits': self.memory_hits,
+                'diskHits': self.disk_hits,
+                'misses': self.misses,
+                'hitRate': hits / lookups if lookups else 0,
+                'size': len(self._entries),
+                'maxSize': self.max_size,
+                'persistent': bool(self.db_path) and not self._db_failed
+            }
@@ -10,8 +10,15 @@ from routes.analytics import analytics
 from routes.auth import auth
 from routes.profile import profile
 from routes.notes import notes
-from transformers import pipeline
-import torch
+import rules
+from db import close_db
+from init_db import migrate
+from analysis_cache import AnalysisCache
+from jobs import JobManager
+from batching import MicroBatcher
+from inference import SENTIMENT_MODEL_NAME, EMOTION_MODEL_NAME, LazyModels, predict
+from tokenization import LengthBucketStats, TokenizationPolicy
+from inference_server import DEFAULT_AUTHKEY, DEFAULT_TIMEOUT, InferenceClient
 from tqdm import tqdm
 
 # configure logging
@@ -41,6 +48,7 @@ CORS(app, resources={
         "origins": ["http://localhost:3000", "http://localhost:3001"],
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
         "allow_headers": ["Content-Type", "Authorization"],
+        "expose_headers": ["X-Next-Cursor"],
         "supports_credentials": True
     }
 })
@@ -60,11 +68,6 @@ app.config['JWT_HEADER_TYPE'] = 'Bearer'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=31)  # set session lifetime to 31 days
 app.config['SESSION_PERMANENT'] = True  # make sessions permanent
 
-# add database keepalive configuration
-app.config['SQLALCHEMY_POOL_RECYCLE'] = 280  # recycle connections before mysql default timeout of 300 seconds
-app.config['SQLALCHEMY_POOL_TIMEOUT'] = 20  # wait 20 seconds for a connection before timing out
-app.config['SQLALCHEMY_POOL_PRE_PING'] = True  # test connections with a ping before using them
-
 jwt = JWTManager(app)
 
 # configure upload folder
@@ -76,19 +79,101 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 # ensure upload directory exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-# initialize models
-
-sentiment_model = pipeline(
-    "sentiment-analysis",
-    model="distilbert-base-uncased-finetuned-sst-2-english",
-    device=0 if torch.cuda.is_available() else -1
+# number of texts per model forward pass in bulk analysis
+app.config['ANALYSIS_BATCH_SIZE'] = 32
+
+# rows read from an upload and analyzed at a time in bulk analysis
+app.config['BULK_CHUNK_ROWS'] = 1000
+
+# files of one upload parsed at the same time in bulk analysis
+app.config['BULK_PARSE_WORKERS'] = 4
+
+# distinct comments per upload whose results are kept to reuse for repeats, later repeats fall back to the analysis cache
+app.config['BULK_DEDUP_MAX_TEXTS'] = 100000
+
+# annotated bulk results kept for export, 'csv.gz' or 'parquet' (needs pyarrow)
+app.config['BULK_RESULTS_DIR'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+app.config['BULK_RESULTS_FORMAT'] = 'csv.gz'
+app.config['BULK_RESULTS_MAX_UPLOADS'] = 20  # per user, the oldest are removed first
+
+# single text requests arriving within ANALYSIS_MAX_WAIT_MS of each other share one forward pass
+app.config['ANALYSIS_MICRO_BATCH_SIZE'] = 16
+app.config['ANALYSIS_MAX_WAIT_MS'] = 5
+
+# number of bulk analysis jobs each worker process runs at the same time
+app.config['BULK_JOB_WORKERS'] = 2
+# queued or running jobs whose worker has not checked in for this many seconds are failed as lost
+app.config['BULK_JOB_STALE_SECONDS'] = 120
+
+# newest analytics activities kept per user, older ones are moved to the archive table
+# once there are ACTIVITY_ARCHIVE_BATCH more than that
+app.config['ACTIVITY_RETENTION'] = 100
+app.config['ACTIVITY_ARCHIVE_BATCH'] = 50
+
+# analysis result cache, set ANALYSIS_CACHE_DB to a file path to keep results across restarts
+app.config['ANALYSIS_CACHE_SIZE'] = 10000
+app.config['ANALYSIS_CACHE_DB'] = None
+
+# inference backend, one of 'torch', 'torch-int8' or 'onnx', see inference.py
+# MODEL_DIR is a local directory holding the models, the onnx backend needs one
+# with an inference server set INFERENCE_BACKEND to the servers backend so cached results are kept apart
+app.config['INFERENCE_BACKEND'] = 'torch'
+app.config['MODEL_DIR'] = None
+
+# never download models, only use MODEL_DIR or models already in the local hugging face cache
+app.config['MODELS_OFFLINE'] = False
+
+# how texts longer than MAX_TOKENS are cut down, 'head', 'head+tail' or 'sliding-window', see tokenization.py
+app.config['TRUNCATION_POLICY'] = 'head+tail'
+app.config['MAX_TOKENS'] = 512
+app.config['HEAD_TOKENS'] = 128  # tokens kept from the start with head+tail
+app.config['WINDOW_STRIDE'] = 256  # tokens between sliding window starts
+
+# batch texts of similar token length together so less compute goes to padding
+app.config['SORT_BY_LENGTH'] = True
+
+# set to ('127.0.0.1', 6001) to use a shared inference_server.py process instead of loading the models here
+app.config['INFERENCE_SERVER_ADDRESS'] = None
+app.config['INFERENCE_SERVER_AUTHKEY'] = DEFAULT_AUTHKEY  # change this in production
+# seconds to wait for the inference server before falling back to neutral predictions
+app.config['INFERENCE_SERVER_TIMEOUT'] = DEFAULT_TIMEOUT
+
+# the models are loaded on the first analysis, or by warmup_models()
+if app.config['INFERENCE_SERVER_ADDRESS']:
+    # the models live in the inference server process
+    models = None
+    inference_client = InferenceClient(
+        app.config['INFERENCE_SERVER_ADDRESS'],
+        app.config['INFERENCE_SERVER_AUTHKEY'],
+        app.config['INFERENCE_SERVER_TIMEOUT']
+    )
+else:
+    models = LazyModels(
+        app.config['INFERENCE_BACKEND'],
+        app.config['MODEL_DIR'],
+        app.config['MODELS_OFFLINE']
+    )
+    inference_client = None
+
+tokenization_policy = TokenizationPolicy(
+    truncation=app.config['TRUNCATION_POLICY'],
+    max_length=app.config['MAX_TOKENS'],
+    head_tokens=app.config['HEAD_TOKENS'],
+    window_stride=app.config['WINDOW_STRIDE'],
+    sort_by_length=app.config['SORT_BY_LENGTH']
 )
 
-
-emotion_model = pipeline(
-    "text-classification",
-    model="bhadresh-savani/distilbert-base-uncased-emotion",
-    device=0 if torch.cuda.is_available() else -1
+# model latency per token length bucket, reported by /api/analytics/inference-stats
+length_bucket_stats = LengthBucketStats()
+
+# cached results are only valid for the models, truncation and rules that produced them
+analysis_cache = AnalysisCache(
+    namespace=(
+        f"{SENTIMENT_MODEL_NAME}|{EMOTION_MODEL_NAME}|{app.config['INFERENCE_BACKEND']}"
+        f"|{app.config['TRUNCATION_POLICY']}-{app.config['MAX_TOKENS']}|rules-v{rules.RULES_VERSION}"
+    ),
+    max_size=app.config['ANALYSIS_CACHE_SIZE'],
+    db_path=app.config['ANALYSIS_CACHE_DB']
 )
 
 def allowed_file(filename):
@@ -202,7 +287,8 @@ def generate_response_suggestions(sentiment, emotion):
     # return 3 suggestions at most
     return suggestions[:3]
 
-def analyze_text(text):
+def _unanalyzable_result(text):
+    """Return the fixed result for text the models can't score, or None if the text should be analyzed."""
     if not text or not text.strip():
         return {
             'sentiment': 'UNKNOWN',
@@ -212,11 +298,8 @@ def analyze_text(text):
             'response_suggestions': []
         }
     
-    # clean the text
-    cleaned_text = text.strip()
-    
     # check if text contains only numbers or symbols
-    if not any(c.isalpha() for c in cleaned_text):
+    if not any(c.isalpha() for c in text.strip()):
         return {
             'sentiment': 'UNKNOWN',
             'sentiment_score': 0,
@@ -225,149 +308,79 @@ def analyze_text(text):
             'response_suggestions': ["I notice your message contains only numbers or symbols. Could you please provide more details?"]
         }
     
-    # initialize variables
-    sentiment_label = 'UNKNOWN'
-    sentiment_score = 0
-    emotion = 'neutral'
+    return None
+
+def run_models(texts, batch_size=None):
+    """
+    Run the sentiment and emotion models over a list of cleaned texts.
     
-    # convert to lowercase for pattern matching
-    text_lower = cleaned_text.lower()
-    
-    # check for direct negative phrases
-    has_negative = any(phrase in text_lower for phrase in [
-        'not good', 'not great', 'bad', 'terrible', 'awful', 'poor', 'horrible', 
-        'disappointing', 'worse', 'worst', 'could be better', 'needs improvement',
-        'should improve', 'not happy', 'not satisfied', 'dislike', 'hate',
-        'frustrated', 'annoyed', 'angry', 'upset', 'sad', 'unhappy'
-    ])
-    
-    # check for direct positive phrases
-    has_positive = any(phrase in text_lower for phrase in [
-        'good', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic', 'outstanding',
-        'exceptional', 'perfect', 'brilliant', 'superb', 'happy', 'glad', 'pleased',
-        'delighted', 'satisfied', 'enjoy', 'love', 'like', 'appreciate'
-    ])
-    
-    # check for double negatives (which are actually positive)
-    has_double_negative = any(phrase in text_lower for phrase in [
-        'not bad', "isn't bad", "aren't bad", "wasn't bad", "weren't bad",
-        'not terrible', "isn't terrible", 'not awful', "isn't awful",
-        'not the worst', "isn't the worst"
-    ])
-    
-    # check for surprise phrases
-    has_surprise = any(phrase in text_lower for phrase in [
-        'wow', 'whoa', 'omg', 'oh my god', 'oh my', 'unexpected', 'surprise', 'surprised',
-        'unbelievable', 'astonishing', 'shocking', "didn't expect", 'shocked',
-        'mind blown', 'jaw dropped', 'astounding'
-    ])
-    
-    # special pattern matching for specific phrases
-    
-    # check for expressions of surprise
-    is_surprise_expression = False
-    surprise_patterns = [
-        "wow", "didn't expect", "unexpected", "surprised", "amazing results", 
-        "can't believe", "incredible", "unbelievable", "astonishing"
-    ]
-    if any(pattern in text_lower for pattern in surprise_patterns):
-        is_surprise_expression = True
-    
-    # check for expressions of love
-    is_love_expression = False
-    love_patterns = [
-        "adore", "love", "can't live without", "obsessed with", "favorite", 
-        "best ever", "absolutely love", "absolutely adore"
-    ]
-    if any(pattern in text_lower for pattern in love_patterns):
-        is_love_expression = True
-    
-    # check for expressions of anger
-    is_anger_expression = False
-    anger_patterns = [
-        "furious", "angry", "mad", "outraged", "terrible service", "awful service", 
-        "horrible service", "unacceptable", "ridiculous", "infuriating", "frustrated",
-        "annoyed", "irritated", "upset", "appalling", "terrible", "horrible", "awful",
-        "worst", "hate", "disgusting", "pathetic", "useless", "waste", "poor service",
-        "bad service", "poor quality", "bad quality",
-        "complaint", "complain", "unsatisfied", "dissatisfied", "not happy", "unhappy",
-        "never again", "never use", "never buy", "never shop", "never return", "never recommend"
-    ]
-    # check if any anger pattern is in the text
-    if any(pattern in text_lower for pattern in anger_patterns):
-        is_anger_expression = True
-    # also check for exclamation marks with negative words as a sign of anger
-    if "!" in text and has_negative:
-        is_anger_expression = True
-    
-
-
-    # check for functionality issues (these should be high priority)
-    has_functionality_issue = False
-    functionality_issue_patterns = [
-        "doesn't work", "does not work", "not working", "broken", "malfunction", 
-        "error", "bug", "glitch", "crash", "freezes", "hangs", "stuck", 
-        "failed", "failure", "unusable", "can't use", "cannot use",
-        "not as advertised", "doesn't work as advertised", "does not work as advertised",
-        "false advertising", "misleading", "misrepresented", "not as described",
-        "not what I expected", "not what was promised", "promised", "advertised"
-    ]
-    if any(pattern in text_lower for pattern in functionality_issue_patterns):
-        has_functionality_issue = True
-    
-    # check for expressions of sadness/disappointment
-    is_sadness_expression = False
-    sadness_patterns = [
-        "disappointed", "disappointing", "disappointment", "sad", "unhappy", "regret", "let down", "letdown",
-        "not as expected", "not what i expected", "dissatisfied", "unsatisfied"
-    ]
-    if any(pattern in text_lower for pattern in sadness_patterns):
-        is_sadness_expression = True
+    Args:
+        texts (list): Cleaned, non-empty texts
+        batch_size (int): Texts per forward pass, defaults to ANALYSIS_BATCH_SIZE
+        
+    Returns:
+        list: (sentiment_label, sentiment_score, emotion) tuples in input order
+    """
+    if inference_client is not None:
+        return inference_client.predict(texts)
     
-
-
-    # check for mixed sentiment expressions
-    is_mixed_sentiment = False
-    mixed_patterns = [
-        "mixed feelings", "pros and cons", "good and bad", "like and dislike",
-        "partly", "somewhat", "kind of", "sort of", "not sure if", "conflicted",
-        "on one hand", "on the other hand", "however", "although", "but", 
-        "nevertheless", "nonetheless", "despite", "in spite of", "while", "whereas",
-        "concerned", "concern", "worried", "worry", "issue", "issues", "problem",
-        "problems", "drawback", "drawbacks", "downside", "downsides"
-    ]
+    if batch_size is None:
+        batch_size = app.config['ANALYSIS_BATCH_SIZE']
     
-    # check for sentences with both positive and negative elements
-    has_both_positive_and_negative = has_positive and has_negative
+    sentiment_model, emotion_model = models.get()
+    return predict(sentiment_model, emotion_model, texts, batch_size, tokenization_policy, length_bucket_stats)
+
+def warmup_models():
+    """
+    Load the models and run a text through them so the first request doesn't wait for it.
     
-    # special "but" detection
-    has_but = "but" in text_lower
+    Called from gunicorn.conf.py, does nothing when an inference server holds the models.
+    """
+    if models is None:
+        return
+    sentiment_model, emotion_model = models.get()
+    predict(sentiment_model, emotion_model, ['Warming up the models'], 1, tokenization_policy)
+
+# coalesces concurrent analyze_text calls into shared model batches
+single_text_batcher = MicroBatcher(
+    run_models,
+    max_batch_size=app.config['ANALYSIS_MICRO_BATCH_SIZE'],
+    max_wait_ms=app.config['ANALYSIS_MAX_WAIT_MS'],
+    name='analyze-text-batcher'
+)
+
+def apply_rules(features, ml_sentiment_label, ml_sentiment_score, ml_emotion):
+    """
+    Apply the rule-based overrides on top of the model predictions for one text.
     
-    # detect mixed sentiment if there are mixed patterns or both positive and negative elements
-    if any(pattern in text_lower for pattern in mixed_patterns) or has_both_positive_and_negative:
-        is_mixed_sentiment = True
+    Args:
+        features (int): Rule feature bitset from rules.extract_features
+        ml_sentiment_label (str): Sentiment label from the sentiment model
+        ml_sentiment_score (float): Confidence of the sentiment label
+        ml_emotion (str): Lowercased emotion label from the emotion model
+        
+    Returns:
+        dict: The analysis result
+    """
+    # initialize variables
+    sentiment_label = 'UNKNOWN'
+    sentiment_score = 0
+    emotion = 'neutral'
     
-    # determine sentiment
+    has_negative = bool(features & rules.NEGATIVE)
+    has_positive = bool(features & rules.POSITIVE)
+    has_double_negative = bool(features & rules.DOUBLE_NEGATIVE)
+    is_surprise_expression = bool(features & rules.SURPRISE)
+    is_love_expression = bool(features & rules.LOVE)
+    has_functionality_issue = bool(features & rules.FUNCTIONALITY_ISSUE)
+    is_sadness_expression = bool(features & rules.SADNESS)
+    has_but = bool(features & rules.BUT)
     
-    # always run ml models first to get baseline
-    ml_sentiment_label = 'UNKNOWN'
-    ml_sentiment_score = 0.5
-    ml_emotion = 'neutral'
+    # exclamation marks with negative words are also a sign of anger
+    is_anger_expression = bool(features & rules.ANGER) or bool(features & rules.EXCLAMATION and has_negative)
     
-    try:
-        # use sentiment model
-        sentiment_result = sentiment_model(cleaned_text)[0]
-        ml_sentiment_label = sentiment_result['label']
-        ml_sentiment_score = sentiment_result['score']
-        
-        # use emotion model
-        emotion_result = emotion_model(cleaned_text)[0]
-        ml_emotion = emotion_result['label'].lower()
-        emotion_score = emotion_result['score']
-        
-
-    except Exception as e:
-        logger.error(f"ML Model error: {str(e)}")
+    # detect mixed sentiment if there are mixed patterns or both positive and negative elements
+    is_mixed_sentiment = bool(features & rules.MIXED) or (has_positive and has_negative)
     
     # now apply rule-based logic with ml model as foundation
     
@@ -387,18 +400,18 @@ def analyze_text(text):
         sentiment_score = ml_sentiment_score
         
         # use ml emotion but with some rule-based overrides for specific cases
-        if is_anger_expression or 'hate' in text_lower:
+        if is_anger_expression or features & rules.HATE:
             emotion = 'anger'
             sentiment_score = max(sentiment_score, 0.85)  # ensure anger gets high score
 
-        elif is_sadness_expression or any(word in text_lower for word in ['disappointed', 'let down', 'sad']):
+        elif is_sadness_expression or features & rules.SAD_WORDS:
             emotion = 'sadness'
 
-        elif 'worried' in text_lower or 'worry' in text_lower or "won't work" in text_lower:
+        elif features & rules.FEAR_WORDS:
             emotion = 'fear'
 
         # new: override for "not good" type patterns that shouldnt be joy
-        elif any(pattern in text_lower for pattern in ['not good', 'not great', 'not bad but', 'bad', 'awful', 'terrible', 'horrible']) and ml_emotion == 'joy':
+        elif features & rules.NOT_JOY and ml_emotion == 'joy':
             emotion = 'sadness'
 
         else:
@@ -430,9 +443,9 @@ def analyze_text(text):
         else:
             sentiment_score = 0.5
         # for mixed sentiment, emotion depends on which aspect is stronger
-        if 'but overall good' in text_lower or 'but i like' in text_lower:
+        if features & rules.MIXED_JOY:
             emotion = 'joy'
-        elif 'but overall bad' in text_lower or 'but i dislike' in text_lower or 'concern' in text_lower or 'worried' in text_lower or 'issue' in text_lower or 'problem' in text_lower:
+        elif features & rules.MIXED_SADNESS:
             emotion = 'sadness'
         else:
             emotion = 'neutral'
@@ -453,14 +466,14 @@ def analyze_text(text):
         emotion = ml_emotion
         
         # apply some emotion-specific overrides
-        if 'worried' in text_lower or 'worry' in text_lower:
+        if features & rules.WORRY:
             emotion = 'fear'
-        elif 'disappointed' in text_lower or 'let down' in text_lower:
+        elif features & rules.DISAPPOINTED:
             emotion = 'sadness'
-        elif 'hate' in text_lower or 'furious' in text_lower:
+        elif features & rules.HATE_FURIOUS:
             emotion = 'anger'
         # additional override: if sentiment is clearly negative but emotion is joy, change to appropriate emotion
-        elif sentiment_label == 'NEGATIVE' and emotion == 'joy' and any(word in text_lower for word in ['not good', 'bad', 'awful', 'terrible', 'horrible']):
+        elif sentiment_label == 'NEGATIVE' and emotion == 'joy' and features & rules.NEGATIVE_JOY:
             emotion = 'sadness'
     
 
@@ -474,7 +487,7 @@ def analyze_text(text):
     priority = get_priority_level(sentiment_score, emotion)
     
     # special case override: if mixed sentiment with concerns, ensure medium priority
-    if is_mixed_sentiment and any(word in text_lower for word in ["concern", "concerned", "worry", "worried", "issue", "issues", "problem", "problems", "reliability", "unreliable"]):
+    if is_mixed_sentiment and features & rules.CONCERN:
         priority = "Medium"
     
     # special case override: if functionality issue, ensure high priority
@@ -494,6 +507,80 @@ def analyze_text(text):
     
     return result
 
+def analyze_text(text):
+    result = _unanalyzable_result(text)
+    if result is not None:
+        return result
+    
+    # clean the text
+    cleaned_text = text.strip()
+    
+    # repeated texts skip both models
+    result = analysis_cache.get(cleaned_text)
+    if result is not None:
+        return result
+    
+    features = rules.extract_features(cleaned_text)
+    ml_sentiment_label, ml_sentiment_score, ml_emotion = single_text_batcher.submit(cleaned_text).result()
+    result = apply_rules(features, ml_sentiment_label, ml_sentiment_score, ml_emotion)
+    # dont cache the fallback result of a failed model run
+    if ml_sentiment_label != 'UNKNOWN':
+        analysis_cache.set(cleaned_text, result)
+    return result
+
+def analyze_texts(texts, batch_size=None):
+    """
+    Analyze a list of texts with batched model inference.
+    
+    Gives the same results as calling analyze_text on each text, but both
+    models see the texts in micro-batches instead of one at a time.
+    
+    Args:
+        texts (list): The texts to analyze
+        batch_size (int): Texts per forward pass, defaults to ANALYSIS_BATCH_SIZE
+        
+    Returns:
+        list: One analyze_text style result per input text, in input order
+    """
+    if batch_size is None:
+        batch_size = app.config['ANALYSIS_BATCH_SIZE']
+    
+    results = [None] * len(texts)
+    pending = []
+    for index, text in enumerate(texts):
+        result = _unanalyzable_result(text)
+        if result is None:
+            # repeated texts skip both models
+            result = analysis_cache.get(text.strip())
+        if result is not None:
+            results[index] = result
+        else:
+            pending.append((index, text.strip()))
+    
+    # scan every pending text for rule phrases in one pass
+    features = rules.extract_features_batch([cleaned_text for _, cleaned_text in pending])
+    
+    # pass every pending text at once so they can be batched by token length
+    predictions = run_models([cleaned_text for _, cleaned_text in pending], batch_size)
+    for (index, cleaned_text), text_features, prediction in zip(pending, features, predictions):
+        results[index] = apply_rules(text_features, *prediction)
+        if prediction[0] != 'UNKNOWN':
+            analysis_cache.set(cleaned_text, results[index])
+    
+    return results
+
+# background queue for /api/analytics/analyze/process
+bulk_jobs = JobManager(
+    max_workers=app.config['BULK_JOB_WORKERS'],
+    stale_seconds=app.config['BULK_JOB_STALE_SECONDS']
+)
+
+# create or upgrade the database tables once at startup
+migrate()
+
+# hand each thread's shared database connection back clean after every request
+app.teardown_appcontext(close_db)
+
 # register blueprints
 app.register_blueprint(analytics, url_prefix='/api/analytics')
 app.register_blueprint(auth, url_prefix='/api/auth')
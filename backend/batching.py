@@ -0,0 +1,133 @@
+"""
+Request coalescing for model inference.
+
+A MicroBatcher collects items submitted from many threads and hands them to
+a batch function together, waiting at most max_wait_ms for a batch to fill.
+It keeps a histogram of batch sizes and recent per-item latencies so the
+batch size and wait settings can be tuned.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    def __init__(self, batch_fn, max_batch_size=32, max_wait_ms=10, name='micro-batcher'):
+        """
+        Args:
+            batch_fn (callable): Takes a list of items and returns one result per item
+            max_batch_size (int): Most items passed to batch_fn at once
+            max_wait_ms (float): Longest time the first item of a batch waits for company
+            name (str): Name of the worker thread
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._size_histogram = {}
+        self._latencies = deque(maxlen=1000)
+        self._batches = 0
+        self._items = 0
+        self.name = name
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        # started on first use rather than in __init__, a thread started before
+        # gunicorn forks its workers would not exist in them
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    worker.start()
+                    self._worker = worker
+
+    def submit(self, item):
+        """Queue one item, returns a Future for its result."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def submit_many(self, items):
+        """Queue several items, returns one Future per item."""
+        return [self.submit(item) for item in items]
+
+    def _collect(self):
+        # block for the first item, then take whatever arrives before the deadline
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _, _ in batch]
+            try:
+                results = self.batch_fn(items)
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logger.error(f"Batch of {len(items)} failed: {e}")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            self._record(batch)
+
+    def _record(self, batch):
+        now = time.monotonic()
+        bucket = size_bucket(len(batch))
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._size_histogram[bucket] = self._size_histogram.get(bucket, 0) + 1
+            self._latencies.extend(now - enqueued for _, _, enqueued in batch)
+
+    def stats(self):
+        """Return the batch size histogram and recent item latency percentiles."""
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            histogram = dict(sorted(self._size_histogram.items(), key=lambda entry: int(entry[0].split('-')[0])))
+            batches = self._batches
+            items = self._items
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            index = min(int(fraction * len(latencies)), len(latencies) - 1)
+            return round(latencies[index] * 1000, 2)
+
+        return {
+            'maxBatchSize': self.max_batch_size,
+            'maxWaitMs': self.max_wait_ms,
+            'batches': batches,
+            'items': items,
+            'averageBatchSize': round(items / batches, 2) if batches else 0,
+            'batchSizeHistogram': histogram,
+            'latencyMs': {
+                'p50': percentile(0.5),
+                'p99': percentile(0.99)
+            },
+            'queued': self._queue.qsize()
+        }
+
+def size_bucket(size):
+    """Label a batch size with its power of two bucket, e.g. 5 -> '5-8'"""
+    upper = 1
+    while upper < size:
+        upper *= 2
+    lower = upper // 2 + 1
+    return str(upper) if lower >= upper else f"{lower}-{upper}"
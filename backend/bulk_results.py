@@ -0,0 +1,285 @@
+"""
+Stored results of bulk analyses, kept per upload for export.
+
+Each file of an upload is saved with the sentiment, sentiment_score, emotion
+and priority of every row appended to the file's own columns. Files are
+written chunk by chunk as they are analyzed and read back the same way, so
+neither side holds a whole file in memory. They are stored as gzip
+compressed CSV, or as Parquet when pyarrow is installed. The manifest records
+which column of each file the comments came from, so the analyzed rows can be
+paged back out for background jobs. A user's oldest uploads are removed once
+they have more than max_uploads.
+
+Layout:
+    <results_dir>/<user_id>/<upload_id>/manifest.json
+    <results_dir>/<user_id>/<upload_id>/<file index>.csv.gz or <file index>.parquet
+"""
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+RESULT_COLUMNS = ['sentiment', 'sentiment_score', 'emotion', 'priority']
+RESULT_FORMATS = ('csv.gz', 'parquet')
+
+_UPLOAD_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+def has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+class UploadResultsWriter:
+    def __init__(self, results_dir, user_id, filenames, result_format='csv.gz', max_uploads=20):
+        """
+        Args:
+            results_dir (str): Directory holding every user's stored results
+            user_id: Owner of the upload
+            filenames (list): Names of the uploaded files, in upload order
+            result_format (str): One of RESULT_FORMATS
+            max_uploads (int): Most uploads kept per user
+        """
+        if result_format == 'parquet' and not has_pyarrow():
+            logger.error("Parquet results need pyarrow, storing gzip CSV instead")
+            result_format = 'csv.gz'
+
+        self.upload_id = uuid.uuid4().hex
+        self.result_format = result_format
+        self.max_uploads = max_uploads
+        self.user_dir = os.path.join(results_dir, str(user_id))
+        self.directory = os.path.join(self.user_dir, self.upload_id)
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._files = [
+            {'index': index, 'fileName': name, 'commentColumn': None, 'resultColumns': None, 'rows': 0, 'analyzedRows': 0}
+            for index, name in enumerate(filenames)
+        ]
+        self._writers = {}
+        self._columns = {}
+
+    def _path(self, file_index):
+        return os.path.join(self.directory, f"{file_index}.{self.result_format}")
+
+    def write(self, file_index, chunk, comment_column, positions, annotations):
+        """
+        Append one analyzed chunk to a file's stored results.
+
+        Args:
+            file_index (int): Index of the file in the upload
+            chunk (DataFrame): The rows as read from the file
+            comment_column: The chunk's column the comments were read from
+            positions (list): Positions in chunk of the analyzed rows
+            annotations (list): Dict with RESULT_COLUMNS keys for each position, None if the row failed
+        """
+        annotated = chunk.reset_index(drop=True)
+        names = self._columns.get(file_index)
+        if names is None:
+            # dont overwrite a column the file already has
+            names = [f"{column}_analysis" if column in annotated.columns else column for column in RESULT_COLUMNS]
+            self._columns[file_index] = names
+            self._files[file_index]['commentColumn'] = str(comment_column)
+            self._files[file_index]['resultColumns'] = [str(name) for name in names]
+
+        values = {column: [None] * len(annotated) for column in RESULT_COLUMNS}
+        for position, annotation in zip(positions, annotations):
+            if annotation is not None:
+                for column in RESULT_COLUMNS:
+                    values[column][position] = annotation[column]
+        # whole percentages, nullable so rows that were not analyzed stay blank
+        values['sentiment_score'] = pd.array(values['sentiment_score'], dtype='Int64')
+        annotated = annotated.assign(**{name: values[column] for name, column in zip(names, RESULT_COLUMNS)})
+
+        if self.result_format == 'parquet':
+            self._write_parquet(file_index, annotated, names)
+        else:
+            self._write_csv(file_index, annotated)
+
+        self._files[file_index]['rows'] += len(annotated)
+        self._files[file_index]['analyzedRows'] += sum(annotation is not None for annotation in annotations)
+
+    def _write_csv(self, file_index, annotated):
+        handle = self._writers.get(file_index)
+        first = handle is None
+        if first:
+            handle = gzip.open(self._path(file_index), 'wt', newline='', encoding='utf-8')
+            self._writers[file_index] = handle
+        annotated.to_csv(handle, header=first, index=False)
+
+    def _write_parquet(self, file_index, annotated, names):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # every chunk has to match the first one's schema, so the file's own
+        # columns are stored as text, which is also how the csv stores them
+        score_name = names[RESULT_COLUMNS.index('sentiment_score')]
+        schema = pa.schema([
+            (str(column), pa.int64() if column == score_name else pa.string())
+            for column in annotated.columns
+        ])
+        annotated = annotated.astype({column: 'string' for column in annotated.columns if column != score_name})
+        annotated.columns = [str(column) for column in annotated.columns]
+        table = pa.Table.from_pandas(annotated, schema=schema, preserve_index=False)
+
+        writer = self._writers.get(file_index)
+        if writer is None:
+            writer = pq.ParquetWriter(self._path(file_index), schema, compression='zstd')
+            self._writers[file_index] = writer
+        writer.write_table(table)
+
+    def _close_writers(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+    def finish(self):
+        """Close the stored files and record the upload, returns its manifest"""
+        self._close_writers()
+        manifest = {
+            'uploadId': self.upload_id,
+            'createdAt': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'format': self.result_format,
+            'files': [
+                {**file, 'stored': os.path.exists(self._path(file['index']))}
+                for file in self._files
+            ]
+        }
+        temp_path = os.path.join(self.directory, 'manifest.json.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, os.path.join(self.directory, 'manifest.json'))
+
+        self._prune()
+        return manifest
+
+    def abort(self):
+        """Drop everything written for an upload that did not finish"""
+        try:
+            self._close_writers()
+        finally:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _prune(self):
+        try:
+            # only finished uploads have a manifest, one still being written is never removed
+            uploads = []
+            for entry in os.scandir(self.user_dir):
+                manifest_path = os.path.join(entry.path, 'manifest.json')
+                if entry.is_dir() and os.path.exists(manifest_path):
+                    uploads.append((os.stat(manifest_path).st_mtime, entry.path))
+            uploads.sort(reverse=True)
+            for _, path in uploads[self.max_uploads:]:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError as e:
+            logger.error(f"Error removing old bulk results: {e}")
+
+def load_manifest(results_dir, user_id, upload_id):
+    """Get the manifest of one of a user's uploads, None if there is no such upload"""
+    if not _UPLOAD_ID_PATTERN.fullmatch(upload_id or ''):
+        return None
+    try:
+        with open(os.path.join(results_dir, str(user_id), upload_id, 'manifest.json'), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def stored_file_path(results_dir, user_id, manifest, file_index):
+    return os.path.join(results_dir, str(user_id), manifest['uploadId'], f"{file_index}.{manifest['format']}")
+
+def _iter_frames(path, result_format, columns, chunk_rows):
+    """Read some columns of a stored file a chunk at a time, values as strings with '' for blanks"""
+    if result_format == 'parquet':
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas().astype('string').fillna('')
+        return
+
+    with pd.read_csv(path, usecols=columns, dtype=str, keep_default_na=False, chunksize=chunk_rows) as reader:
+        yield from reader
+
+def read_results(results_dir, user_id, manifest, offset, limit, chunk_rows=1000):
+    """
+    Read a page of an upload's analyzed rows from its stored files, in upload order.
+
+    Rows that were not analyzed are left out. Files that end before offset
+    are skipped using their analyzedRows count, so only the files the page
+    falls in are read.
+
+    Args:
+        offset (int): Analyzed rows to skip
+        limit (int): Most rows to return
+
+    Returns:
+        list: Dicts with text, sentiment, sentiment_score, emotion, priority and source_file keys
+    """
+    results = []
+    for file in manifest['files']:
+        if len(results) >= limit:
+            break
+        if offset >= file['analyzedRows']:
+            offset -= file['analyzedRows']
+            continue
+
+        comment_column = file['commentColumn']
+        sentiment, score, emotion, priority = file['resultColumns']
+        path = stored_file_path(results_dir, user_id, manifest, file['index'])
+        for frame in _iter_frames(path, manifest['format'], [comment_column, *file['resultColumns']], chunk_rows):
+            analyzed = frame[frame[sentiment] != '']
+            if offset >= len(analyzed):
+                offset -= len(analyzed)
+                continue
+
+            for _, row in analyzed.iloc[offset:offset + limit - len(results)].iterrows():
+                text = row[comment_column].strip()
+                results.append({
+                    'text': text[:100] + '...' if len(text) > 100 else text,
+                    'sentiment': row[sentiment],
+                    'sentiment_score': int(row[score]),
+                    'emotion': row[emotion],
+                    'priority': row[priority],
+                    'source_file': file['fileName']
+                })
+            offset = 0
+            if len(results) >= limit:
+                break
+
+    return results
+
+def iter_csv(results_dir, user_id, manifest, file_index, chunk_rows=1000):
+    """
+    Read a stored file back as CSV text, a block at a time.
+
+    Yields:
+        str: The next part of the annotated CSV, starting with the header
+    """
+    path = stored_file_path(results_dir, user_id, manifest, file_index)
+
+    if manifest['format'] == 'parquet':
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        first = True
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+            # keep integer scores as integers next to rows that have none
+            frame = batch.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+            yield frame.to_csv(index=False, header=first)
+            first = False
+        return
+
+    with gzip.open(path, 'rt', newline='', encoding='utf-8') as f:
+        while True:
+            block = f.read(64 * 1024)
+            if not block:
+                return
+            yield block
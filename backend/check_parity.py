@@ -0,0 +1,112 @@
+"""
+Check that an inference backend still agrees with the fp32 PyTorch models.
+
+Runs both over a set of fixture texts and compares the sentiment labels,
+sentiment scores and emotion labels, along with how fast each one ran.
+Exits with status 1 if the agreement is below the given thresholds, so it
+can gate switching INFERENCE_BACKEND in app.py.
+
+Run with:
+    python check_parity.py --backend torch-int8
+    python check_parity.py --backend onnx --model-dir models/onnx
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+from inference import INFERENCE_BACKENDS, load_models, predict
+
+DEFAULT_TEXTS = os.path.join(os.path.dirname(__file__), 'fixtures', 'parity_texts.txt')
+
+def read_texts(path):
+    """One text per line, blank lines are skipped"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def timed_predict(models, texts, batch_size):
+    sentiment_model, emotion_model = models
+    # warm up so one-off setup is not counted
+    predict(sentiment_model, emotion_model, texts[:batch_size], batch_size)
+
+    start = time.perf_counter()
+    predictions = predict(sentiment_model, emotion_model, texts, batch_size)
+    return predictions, time.perf_counter() - start
+
+def compare(reference, candidate):
+    """
+    Compare two lists of (sentiment_label, sentiment_score, emotion) predictions.
+
+    Returns:
+        dict: Label agreement rates, score differences and the indexes of texts that disagree
+    """
+    sentiment_matches = emotion_matches = 0
+    score_diffs = []
+    mismatches = []
+
+    for index, (expected, actual) in enumerate(zip(reference, candidate)):
+        sentiment_match = expected[0] == actual[0]
+        emotion_match = expected[2] == actual[2]
+        sentiment_matches += sentiment_match
+        emotion_matches += emotion_match
+        if sentiment_match:
+            score_diffs.append(abs(expected[1] - actual[1]))
+        if not (sentiment_match and emotion_match):
+            mismatches.append(index)
+
+    count = len(reference) or 1
+    return {
+        'sentiment_agreement': sentiment_matches / count,
+        'emotion_agreement': emotion_matches / count,
+        'mean_score_diff': sum(score_diffs) / len(score_diffs) if score_diffs else 0.0,
+        'max_score_diff': max(score_diffs, default=0.0),
+        'mismatches': mismatches
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare an inference backend against the fp32 models')
+    parser.add_argument('--backend', choices=INFERENCE_BACKENDS, required=True)
+    parser.add_argument('--model-dir', default=None, help='models for the backend being checked')
+    parser.add_argument('--reference-model-dir', default=None, help='fp32 PyTorch models, downloaded if not set')
+    parser.add_argument('--texts', default=DEFAULT_TEXTS, help='file with one text per line')
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--min-agreement', type=float, default=0.98)
+    parser.add_argument('--max-score-diff', type=float, default=0.05)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    texts = read_texts(args.texts)
+    if not texts:
+        print(f"No texts in {args.texts}")
+        return 1
+
+    reference, reference_seconds = timed_predict(
+        load_models('torch', args.reference_model_dir), texts, args.batch_size
+    )
+    candidate, candidate_seconds = timed_predict(
+        load_models(args.backend, args.model_dir), texts, args.batch_size
+    )
+    result = compare(reference, candidate)
+
+    print(f"Texts:               {len(texts)}")
+    print(f"Sentiment agreement: {result['sentiment_agreement']:.1%}")
+    print(f"Emotion agreement:   {result['emotion_agreement']:.1%}")
+    print(f"Score difference:    mean {result['mean_score_diff']:.4f}, max {result['max_score_diff']:.4f}")
+    print(f"fp32 torch:          {len(texts) / reference_seconds:.1f} texts/s")
+    print(f"{args.backend + ':':<21}{len(texts) / candidate_seconds:.1f} texts/s "
+          f"({reference_seconds / candidate_seconds:.2f}x)")
+
+    for index in result['mismatches']:
+        print(f"  {texts[index]!r}: {reference[index]} -> {candidate[index]}")
+
+    passed = (
+        result['sentiment_agreement'] >= args.min_agreement
+        and result['emotion_agreement'] >= args.min_agreement
+        and result['max_score_diff'] <= args.max_score_diff
+    )
+    print('PASS' if passed else 'FAIL')
+    return 0 if passed else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
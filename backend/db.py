@@ -0,0 +1,80 @@
+"""
+Shared SQLite connection handling for every blueprint.
+
+Each thread keeps one connection to database.db and reuses it, along with its
+prepared statement cache, instead of opening a new connection per call.
+Connections run in WAL mode so readers never wait for the writer, wait on a
+busy timeout instead of failing with "database is locked", and use
+synchronous=NORMAL and memory mapped reads.
+
+A connection is never used across a fork. A process forked after opening one,
+like a gunicorn worker forked from a preloading master, opens its own.
+
+Code keeps the usual pattern of conn = get_db() ... conn.close(). close()
+only hands the connection back; whatever was left uncommitted is rolled back
+once the outermost user in the thread is done with it.
+"""
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.path.join(os.path.dirname(__file__), 'database.db')
+
+# how long a writer waits for the lock before giving up
+BUSY_TIMEOUT_MS = 5000
+
+# bytes of the database file read through mmap
+MMAP_SIZE = 64 * 1024 * 1024
+
+# prepared statements kept per connection
+CACHED_STATEMENTS = 256
+
+_local = threading.local()
+
+class PooledConnection(sqlite3.Connection):
+    """Connection whose close() returns it to its thread instead of closing it."""
+
+    def close(self):
+        _local.depth = max(getattr(_local, 'depth', 1) - 1, 0)
+        if _local.depth == 0 and self.in_transaction:
+            self.rollback()
+
+def _connect():
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        factory=PooledConnection,
+        cached_statements=CACHED_STATEMENTS
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+    return conn
+
+def get_db():
+    """Get this thread's connection to database.db, opening it on first use"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        try:
+            conn = _connect()
+        except Exception as e:
+            logger.error(f"Database connection error: {e}")
+            raise
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.depth = 0
+
+    _local.depth += 1
+    return conn
+
+def close_db(exception=None):
+    """Request teardown, drops anything a handler left uncommitted"""
+    conn = getattr(_local, 'conn', None)
+    _local.depth = 0
+    if conn is not None and _local.pid == os.getpid() and conn.in_transaction:
+        conn.rollback()
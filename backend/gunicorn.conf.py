@@ -0,0 +1,43 @@
+"""
+Gunicorn settings for the backend.
+
+Run with:
+    gunicorn -c gunicorn.conf.py app:app
+
+Workers start without the models, they are loaded on the first analysis.
+Set SUNSIGHTS_PRELOAD_MODELS=1 to load them once in the master before the
+workers fork so every worker shares the same copy of the weights, and
+SUNSIGHTS_WARMUP=1 to run a text through the models in each worker before
+it takes requests.
+"""
+import os
+
+bind = os.environ.get('SUNSIGHTS_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('SUNSIGHTS_WORKERS', '2'))
+
+# threads of one worker share its models and batch their texts together
+worker_class = 'gthread'
+threads = int(os.environ.get('SUNSIGHTS_THREADS', '4'))
+
+# loading the models can take longer than the default 30 seconds
+timeout = 120
+
+preload_models = os.environ.get('SUNSIGHTS_PRELOAD_MODELS') == '1'
+warmup = os.environ.get('SUNSIGHTS_WARMUP') == '1'
+
+# the app has to be imported in the master for its models to be shared
+preload_app = preload_models
+
+def when_ready(server):
+    # runs in the master after the app is imported and before any worker forks,
+    # only load here, running the models before forking can hang the workers
+    if preload_models:
+        from app import models
+        if models is not None:
+            models.get()
+            server.log.info("Models loaded in the master")
+
+def post_worker_init(worker):
+    if warmup:
+        from app import warmup_models
+        warmup_models()
@@ -0,0 +1,83 @@
+"""
+Resolves the logged in user from their JWT.
+
+Tokens issued at register/login carry the user id in a 'uid' claim, so most
+requests need no lookup at all. Older tokens only carry the email; those are
+resolved with one query, cached on flask.g for the rest of the request and
+in a small process-wide TTL cache for later requests. The process cache is
+invalidated when a user changes their email.
+"""
+import logging
+import threading
+import time
+
+from flask import g
+from flask_jwt_extended import get_jwt, get_jwt_identity
+
+from db import get_db
+
+logger = logging.getLogger(__name__)
+
+# JWT claim holding the users id
+USER_ID_CLAIM = 'uid'
+
+# how long an email -> id lookup is reused
+CACHE_TTL_SECONDS = 300
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def identity_claims(user_id):
+    """Extra JWT claims to issue with a users access token"""
+    return {USER_ID_CLAIM: user_id}
+
+def _lookup_user_id(email):
+    conn = get_db()
+    try:
+        user = conn.execute("SELECT id FROM users WHERE email = ?", (email,)).fetchone()
+        return user[0] if user else None
+    finally:
+        conn.close()
+
+def get_user_id(email):
+    """Get a users id from their email, None if there is no such user"""
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(email)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    user_id = _lookup_user_id(email)
+    # unknown emails are not cached so a user who registers is found straight away
+    if user_id is not None:
+        with _cache_lock:
+            _cache[email] = (user_id, now + CACHE_TTL_SECONDS)
+    return user_id
+
+def invalidate(email):
+    """Forget the cached id for an email, call when a user's email changes"""
+    with _cache_lock:
+        _cache.pop(email, None)
+
+def current_user_id():
+    """
+    Get the id of the user making the current request.
+
+    Must be called inside a @jwt_required() view.
+
+    Returns:
+        int: The users id, or None if the token's user no longer exists
+    """
+    if 'current_user_id' in g:
+        return g.current_user_id
+
+    user_id = get_jwt().get(USER_ID_CLAIM)
+    if user_id is None:
+        try:
+            user_id = get_user_id(get_jwt_identity())
+        except Exception as e:
+            logger.error(f"Error getting user ID: {str(e)}")
+            return None
+
+    g.current_user_id = user_id
+    return user_id
@@ -0,0 +1,384 @@
+"""
+Model loading and batched prediction for the sentiment and emotion models.
+
+This module has no Flask dependencies so it can be used both by the web app
+and by the standalone inference server.
+
+The models can run on one of these backends:
+    torch       the fp32 PyTorch models
+    torch-int8  the PyTorch models with their Linear layers dynamically quantized to int8
+    onnx        ONNX Runtime exports of the models, needs optimum[onnxruntime]
+
+model_dir points at a local directory with a sentiment/ and an emotion/
+subdirectory holding each model and its tokenizer. It is required for onnx,
+export the models there with:
+    optimum-cli export onnx --model distilbert-base-uncased-finetuned-sst-2-english --task text-classification <model_dir>/sentiment
+    optimum-cli export onnx --model bhadresh-savani/distilbert-base-uncased-emotion --task text-classification <model_dir>/emotion
+For the torch backends the models are downloaded from the hub if model_dir is not set.
+
+Check a backend still agrees with fp32 before switching to it with check_parity.py.
+
+Both models are DistilBERT fine-tunes on the same uncased vocab, so when their
+tokenizers match each text is tokenized once and the same tensors are fed to
+both models. The encoders themselves are separately fine-tuned, so each model
+still runs its own forward pass. How long texts are truncated and how texts
+are grouped into batches on that path is set by a TokenizationPolicy, see
+tokenization.py. Without a shared tokenizer the pipelines keep the first
+tokens of long texts.
+"""
+import logging
+import os
+import threading
+import time
+
+from tokenization import TokenizationPolicy
+
+logger = logging.getLogger(__name__)
+
+SENTIMENT_MODEL_NAME = "distilbert-base-uncased-finetuned-sst-2-english"
+EMOTION_MODEL_NAME = "bhadresh-savani/distilbert-base-uncased-emotion"
+
+INFERENCE_BACKENDS = ('torch', 'torch-int8', 'onnx')
+
+# returned for a text when a model fails
+FALLBACK_PREDICTION = ('UNKNOWN', 0.5, 'neutral')
+
+def load_models(backend='torch', model_dir=None, offline=False):
+    """
+    Load the sentiment and emotion pipelines.
+
+    Args:
+        backend (str): One of INFERENCE_BACKENDS
+        model_dir (str): Local directory with sentiment/ and emotion/ model subdirectories
+        offline (bool): Never contact the hub, only use model_dir or models already in the local cache
+
+    Returns:
+        tuple: (sentiment_model, emotion_model)
+    """
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {INFERENCE_BACKENDS}")
+    if backend == 'onnx' and not model_dir:
+        raise ValueError("The onnx backend needs model_dir pointing at the exported models")
+
+    sentiment_source = os.path.join(model_dir, 'sentiment') if model_dir else SENTIMENT_MODEL_NAME
+    emotion_source = os.path.join(model_dir, 'emotion') if model_dir else EMOTION_MODEL_NAME
+
+    sentiment_model = _load_pipeline("sentiment-analysis", sentiment_source, backend, offline)
+    emotion_model = _load_pipeline("text-classification", emotion_source, backend, offline)
+    share_tokenizer(sentiment_model, emotion_model)
+
+    return sentiment_model, emotion_model
+
+def _load_pipeline(task, source, backend, offline):
+    # imported here so processes that only talk to the inference server never load torch
+    from transformers import AutoTokenizer, pipeline
+    import torch
+
+    tokenizer = AutoTokenizer.from_pretrained(source, local_files_only=offline)
+
+    if backend == 'onnx':
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+        except ImportError:
+            logger.error("The onnx backend needs optimum[onnxruntime], install it with pip install optimum[onnxruntime]")
+            raise
+
+        model = ORTModelForSequenceClassification.from_pretrained(source, local_files_only=offline)
+        return pipeline(task, model=model, tokenizer=tokenizer)
+
+    from transformers import AutoModelForSequenceClassification
+    model = AutoModelForSequenceClassification.from_pretrained(source, local_files_only=offline)
+
+    if backend == 'torch-int8':
+        # int8 kernels are CPU only
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return pipeline(task, model=model, tokenizer=tokenizer, device=-1)
+
+    return pipeline(task, model=model, tokenizer=tokenizer, device=0 if torch.cuda.is_available() else -1)
+
+class LazyModels:
+    """Loads the sentiment and emotion models the first time they are needed."""
+
+    def __init__(self, backend='torch', model_dir=None, offline=False):
+        """
+        Args:
+            backend (str): One of INFERENCE_BACKENDS
+            model_dir (str): Local directory holding the models, see load_models
+            offline (bool): Never contact the hub
+        """
+        self.backend = backend
+        self.model_dir = model_dir
+        self.offline = offline
+        self._models = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._models is not None
+
+    def get(self):
+        """Return (sentiment_model, emotion_model), loading them on the first call"""
+        models = self._models
+        if models is None:
+            # threads that arrive while the models load wait for them instead of loading a second copy
+            with self._lock:
+                if self._models is None:
+                    start = time.perf_counter()
+                    self._models = load_models(self.backend, self.model_dir, self.offline)
+                    logger.info(f"Loaded the {self.backend} models in {time.perf_counter() - start:.1f}s")
+                models = self._models
+        return models
+
+def tokenizers_match(first, second):
+    """True if two tokenizers turn any text into the same input ids"""
+    return (
+        type(first) is type(second)
+        and getattr(first, 'do_lower_case', None) == getattr(second, 'do_lower_case', None)
+        and first.special_tokens_map == second.special_tokens_map
+        and first.padding_side == second.padding_side
+        and first.get_vocab() == second.get_vocab()
+    )
+
+def share_tokenizer(sentiment_model, emotion_model):
+    """
+    Make the emotion pipeline use the sentiment pipeline's tokenizer if they match.
+
+    Returns:
+        bool: True if the pipelines now share one tokenizer
+    """
+    sentiment_tokenizer = getattr(sentiment_model, 'tokenizer', None)
+    emotion_tokenizer = getattr(emotion_model, 'tokenizer', None)
+    if sentiment_tokenizer is None or emotion_tokenizer is None:
+        return False
+
+    if not tokenizers_match(sentiment_tokenizer, emotion_tokenizer):
+        logger.warning("Sentiment and emotion tokenizers differ, texts will be tokenized once per model")
+        return False
+
+    emotion_model.tokenizer = sentiment_tokenizer
+    return True
+
+def shares_tokenizer(sentiment_model, emotion_model):
+    tokenizer = getattr(sentiment_model, 'tokenizer', None)
+    return tokenizer is not None and tokenizer is getattr(emotion_model, 'tokenizer', None)
+
+def tokenize(sentiment_model, texts, policy=None):
+    """
+    Tokenize texts once for both models, cut down as set by the policy.
+
+    Args:
+        sentiment_model: The sentiment pipeline, its tokenizer is used
+        texts (list): Cleaned, non-empty texts
+        policy (TokenizationPolicy): Truncation settings, defaults to TokenizationPolicy()
+
+    Returns:
+        BatchEncoding: input_ids with special tokens, one list per model input, and
+            overflow_to_sample_mapping, the index of the text each input came from.
+            A text split into sliding windows has one input per window
+    """
+    from transformers import BatchEncoding
+
+    policy = policy or TokenizationPolicy()
+    tokenizer = sentiment_model.tokenizer
+    content_length = _max_length(tokenizer, policy) - tokenizer.num_special_tokens_to_add()
+
+    input_ids = []
+    owners = []
+    for index, token_ids in enumerate(tokenizer(texts, add_special_tokens=False, verbose=False)['input_ids']):
+        text_pieces = policy.split(token_ids, content_length)
+        input_ids.extend(tokenizer.build_inputs_with_special_tokens(piece) for piece in text_pieces)
+        owners.extend([index] * len(text_pieces))
+
+    return BatchEncoding({'input_ids': input_ids, 'overflow_to_sample_mapping': owners})
+
+def _max_length(tokenizer, policy):
+    return min(policy.max_length, tokenizer.model_max_length)
+
+def _encoded_pieces(tokenizer, encoded, policy):
+    """Unpadded input ids and their text index for each input, over long ones cut down by the policy"""
+    input_ids = encoded['input_ids']
+    if hasattr(input_ids, 'tolist'):
+        input_ids = input_ids.tolist()
+    attention_mask = encoded.get('attention_mask')
+    if attention_mask is not None:
+        # right padded tensors, keep the attended tokens of each row
+        if hasattr(attention_mask, 'tolist'):
+            attention_mask = attention_mask.tolist()
+        input_ids = [ids[:sum(mask)] for ids, mask in zip(input_ids, attention_mask)]
+    owners = encoded.get('overflow_to_sample_mapping')
+    if owners is None:
+        owners = range(len(input_ids))
+    elif hasattr(owners, 'tolist'):
+        owners = owners.tolist()
+
+    max_length = _max_length(tokenizer, policy)
+    content_length = max_length - tokenizer.num_special_tokens_to_add()
+    pieces = []
+    piece_owners = []
+    for ids, owner in zip(input_ids, owners):
+        if len(ids) <= max_length:
+            pieces.append(ids)
+            piece_owners.append(owner)
+            continue
+        # encoded without truncation, apply the policy to the text between the special tokens
+        special = tokenizer.get_special_tokens_mask(ids, already_has_special_tokens=True)
+        content = [token for token, is_special in zip(ids, special) if not is_special]
+        for piece in policy.split(content, content_length):
+            pieces.append(tokenizer.build_inputs_with_special_tokens(piece))
+            piece_owners.append(owner)
+    return pieces, piece_owners
+
+def predict_encoded(sentiment_model, emotion_model, encoded, batch_size, policy=None, stats=None):
+    """
+    Run both models over already tokenized texts.
+
+    The models must share a tokenizer, see share_tokenizer. Inputs are batched
+    in the policy's order, shortest first by default, so each batch is only
+    padded to the longest input in it, and inputs longer than the models take
+    are cut down by the policy the same way predict() does.
+
+    Args:
+        sentiment_model: The sentiment pipeline
+        emotion_model: The emotion pipeline
+        encoded: From tokenize(), or the shared tokenizer's output with special tokens.
+            input_ids may be lists or right padded tensors with an attention_mask.
+            With overflow_to_sample_mapping the inputs of one text are averaged
+        batch_size (int): Model inputs per forward pass
+        policy (TokenizationPolicy): Truncation and batching settings, defaults to TokenizationPolicy()
+        stats (LengthBucketStats): Optional latency stats to record each batch in
+
+    Returns:
+        list: (sentiment_label, sentiment_score, emotion) tuples, one per text in input order
+    """
+    import torch
+
+    policy = policy or TokenizationPolicy()
+    tokenizer = sentiment_model.tokenizer
+    pieces, owners = _encoded_pieces(tokenizer, encoded, policy)
+    text_count = max(owners) + 1 if owners else 0
+
+    sentiment_probs = [0] * text_count
+    emotion_probs = [0] * text_count
+    piece_counts = [0] * text_count
+    order = policy.order(pieces)
+
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            length = max(len(pieces[index]) for index in batch)
+            input_ids = torch.full((len(batch), length), tokenizer.pad_token_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(batch), length), dtype=torch.long)
+            for row, index in enumerate(batch):
+                input_ids[row, :len(pieces[index])] = torch.tensor(pieces[index])
+                attention_mask[row, :len(pieces[index])] = 1
+            inputs = {
+                'input_ids': input_ids.to(sentiment_model.device),
+                'attention_mask': attention_mask.to(sentiment_model.device)
+            }
+
+            began = time.perf_counter()
+            sentiment_batch = sentiment_model.model(**inputs).logits.softmax(dim=-1).cpu()
+            emotion_batch = emotion_model.model(**inputs).logits.softmax(dim=-1).cpu()
+            if stats is not None:
+                stats.record(length, len(batch), time.perf_counter() - began)
+
+            # a text split into windows gets the average of their probabilities
+            for row, index in enumerate(batch):
+                owner = owners[index]
+                sentiment_probs[owner] = sentiment_probs[owner] + sentiment_batch[row]
+                emotion_probs[owner] = emotion_probs[owner] + emotion_batch[row]
+                piece_counts[owner] += 1
+
+    sentiment_labels = sentiment_model.model.config.id2label
+    emotion_labels = emotion_model.model.config.id2label
+
+    predictions = []
+    for text_sentiment, text_emotion, count in zip(sentiment_probs, emotion_probs, piece_counts):
+        if not count:
+            predictions.append(FALLBACK_PREDICTION)
+            continue
+        score, sentiment_id = (text_sentiment / count).max(dim=-1)
+        predictions.append((
+            sentiment_labels[int(sentiment_id)],
+            float(score),
+            emotion_labels[int(text_emotion.argmax())].lower()
+        ))
+    return predictions
+
+def predict_with_policy(sentiment_model, emotion_model, texts, batch_size, policy, stats=None):
+    """
+    Run both models over texts tokenized once by the shared tokenizer.
+
+    Long texts are cut down or split into windows by the policy, see
+    tokenize() and predict_encoded().
+
+    Returns:
+        list: (sentiment_label, sentiment_score, emotion) tuples in input order
+    """
+    encoded = tokenize(sentiment_model, texts, policy)
+    return predict_encoded(sentiment_model, emotion_model, encoded, batch_size, policy, stats)
+
+def predict_single(sentiment_model, emotion_model, cleaned_text):
+    """Run both models on one text, keeping whatever succeeded if a model fails."""
+    ml_sentiment_label, ml_sentiment_score, ml_emotion = FALLBACK_PREDICTION
+
+    try:
+        # use sentiment model
+        sentiment_result = sentiment_model(cleaned_text, truncation=True)[0]
+        ml_sentiment_label = sentiment_result['label']
+        ml_sentiment_score = sentiment_result['score']
+
+        # use emotion model
+        emotion_result = emotion_model(cleaned_text, truncation=True)[0]
+        ml_emotion = emotion_result['label'].lower()
+    except Exception as e:
+        logger.error(f"ML Model error: {str(e)}")
+
+    return ml_sentiment_label, ml_sentiment_score, ml_emotion
+
+def predict(sentiment_model, emotion_model, texts, batch_size, policy=None, stats=None):
+    """
+    Run the sentiment and emotion models over a list of cleaned texts.
+
+    When the models share a tokenizer the texts are tokenized once and fed to
+    both models as set by the tokenization policy, see predict_with_policy.
+    Otherwise both pipelines are fed the whole list so they run in
+    micro-batches of batch_size, padded to the longest text of each batch.
+
+    Args:
+        sentiment_model: The sentiment pipeline
+        emotion_model: The emotion pipeline
+        texts (list): Cleaned, non-empty texts
+        batch_size (int): Texts per forward pass
+        policy (TokenizationPolicy): Truncation and batching settings, defaults to TokenizationPolicy()
+        stats (LengthBucketStats): Optional latency stats to record each batch in
+
+    Returns:
+        list: (sentiment_label, sentiment_score, emotion) tuples in input order
+    """
+    if not texts:
+        return []
+
+    if shares_tokenizer(sentiment_model, emotion_model):
+        try:
+            return predict_with_policy(
+                sentiment_model, emotion_model, texts, batch_size, policy or TokenizationPolicy(), stats
+            )
+        except Exception as e:
+            logger.error(f"ML Model batch error, falling back to single texts: {str(e)}")
+            return [predict_single(sentiment_model, emotion_model, text) for text in texts]
+
+    if len(texts) == 1:
+        return [predict_single(sentiment_model, emotion_model, texts[0])]
+
+    try:
+        sentiment_results = sentiment_model(texts, batch_size=batch_size, truncation=True)
+        emotion_results = emotion_model(texts, batch_size=batch_size, truncation=True)
+        return [
+            (sentiment_result['label'], sentiment_result['score'], emotion_result['label'].lower())
+            for sentiment_result, emotion_result in zip(sentiment_results, emotion_results)
+        ]
+    except Exception as e:
+        # one bad text fails the whole batch, so retry one by one
+        logger.error(f"ML Model batch error, falling back to single texts: {str(e)}")
+        return [predict_single(sentiment_model, emotion_model, text) for text in texts]
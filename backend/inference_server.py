@@ -0,0 +1,186 @@
+"""
+Standalone inference server that holds the only copy of the models.
+
+Flask workers send lists of cleaned texts over a local socket and get back
+('ok', [(sentiment_label, sentiment_score, emotion), ...]), or ('error', message)
+when the models failed on the batch. Texts from all connected
+workers are coalesced into shared batches, so many lightweight HTTP workers
+can run the rule stage on every core without each loading both models.
+
+Run with:
+    python inference_server.py --port 6001
+
+and set INFERENCE_SERVER_ADDRESS in app.py to ('127.0.0.1', 6001).
+"""
+import argparse
+import logging
+import threading
+from multiprocessing.connection import Client, Listener
+
+from batching import MicroBatcher
+from inference import FALLBACK_PREDICTION, INFERENCE_BACKENDS
+from tokenization import TRUNCATION_POLICIES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AUTHKEY = b'sunsights-inference'  # change this in production
+
+# seconds a client waits for the server to answer before falling back
+DEFAULT_TIMEOUT = 60
+
+class InferenceServerError(Exception):
+    """The inference server could not analyze a request."""
+
+class InferenceServer:
+    def __init__(self, address, authkey=DEFAULT_AUTHKEY, batch_size=32, max_wait_ms=10, backend='torch', model_dir=None, offline=False, truncation='head+tail'):
+        """
+        Args:
+            address (tuple): (host, port) to listen on
+            authkey (bytes): Shared secret clients must present
+            batch_size (int): Most texts run through the models at once
+            max_wait_ms (float): Longest a text waits for others to share its batch
+            backend (str): Inference backend, one of inference.INFERENCE_BACKENDS
+            model_dir (str): Local directory holding the models, see inference.load_models
+            offline (bool): Never download the models
+            truncation (str): How long texts are cut down, one of tokenization.TRUNCATION_POLICIES
+        """
+        from inference import load_models, predict
+        from tokenization import TokenizationPolicy
+
+        self.address = address
+        self.authkey = authkey
+        sentiment_model, emotion_model = load_models(backend, model_dir, offline)
+        policy = TokenizationPolicy(truncation=truncation)
+        self.batcher = MicroBatcher(
+            lambda texts: predict(sentiment_model, emotion_model, texts, batch_size, policy),
+            max_batch_size=batch_size,
+            max_wait_ms=max_wait_ms,
+            name='inference-batcher'
+        )
+
+    def serve_forever(self):
+        # the default backlog of 1 stalls workers that connect at the same time
+        with Listener(self.address, backlog=128, authkey=self.authkey) as listener:
+            logger.info(f"Inference server listening on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    logger.error(f"Inference server accept error: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        # one thread per client connection, each request is a list of texts
+        with conn:
+            while True:
+                try:
+                    texts = conn.recv()
+                except EOFError:
+                    return
+                try:
+                    futures = self.batcher.submit_many(texts)
+                    reply = ('ok', [future.result() for future in futures])
+                except Exception as e:
+                    # tell the client, otherwise it waits on a reply that never comes
+                    logger.error(f"Inference server prediction error: {e}")
+                    reply = ('error', str(e))
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+
+class InferenceClient:
+    """Client for InferenceServer, keeps one connection per thread."""
+
+    def __init__(self, address, authkey=DEFAULT_AUTHKEY, timeout=DEFAULT_TIMEOUT):
+        """
+        Args:
+            address (tuple): (host, port) of the server
+            authkey (bytes): Shared secret the server expects
+            timeout (float): Seconds to wait for a reply before falling back
+        """
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = Client(self.address, authkey=self.authkey)
+            self._local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def predict(self, texts):
+        """
+        Get model predictions for texts from the server.
+
+        Falls back to FALLBACK_PREDICTION for every text if the server can't
+        be reached, doesn't answer within the timeout or reports an error.
+
+        Returns:
+            list: (sentiment_label, sentiment_score, emotion) tuples in input order
+        """
+        if not texts:
+            return []
+
+        try:
+            return self._request(list(texts))
+        except InferenceServerError as e:
+            logger.error(f"Inference server error: {e}")
+            return [FALLBACK_PREDICTION] * len(texts)
+
+    def _request(self, texts):
+        # retry once on a fresh connection in case the server was restarted
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send(texts)
+                if not conn.poll(self.timeout):
+                    # a late reply would be read as the answer to the next request
+                    self._reset()
+                    raise InferenceServerError(f"no reply within {self.timeout}s")
+                status, reply = conn.recv()
+            except (EOFError, OSError) as e:
+                self._reset()
+                if attempt == 1:
+                    raise InferenceServerError(str(e))
+                continue
+
+            if status != 'ok':
+                raise InferenceServerError(reply)
+            return reply
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sunsights inference server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6001)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    parser.add_argument('--backend', choices=INFERENCE_BACKENDS, default='torch')
+    parser.add_argument('--model-dir', default=None)
+    parser.add_argument('--offline', action='store_true', help='never download the models')
+    parser.add_argument('--truncation', choices=TRUNCATION_POLICIES, default='head+tail')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = InferenceServer(
+        (args.host, args.port),
+        batch_size=args.batch_size,
+        max_wait_ms=args.max_wait_ms,
+        backend=args.backend,
+        model_dir=args.model_dir,
+        offline=args.offline,
+        truncation=args.truncation
+    )
+    server.serve_forever()
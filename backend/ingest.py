@@ -0,0 +1,312 @@
+"""
+Streaming readers for bulk analysis uploads.
+
+Uploads are read in bounded chunks of rows instead of being loaded whole, so
+peak memory depends on the chunk size rather than the file size. CSV files are
+read with pandas' chunked reader and xlsx files with openpyxl's read-only mode.
+Legacy xls files have no streaming reader and are loaded whole, then chunked.
+Multi-file uploads are parsed by a thread per file. Each file's comment
+column is picked from a sample of its first chunk, unless the client names one.
+"""
+import csv
+import io
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from analysis_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# preferred names for the comment column, in order
+COMMENT_COLUMN_NAMES = ['comment', 'comments', 'text', 'feedback', 'review', 'message', 'content']
+_COMMENT_NAME_RANKS = {name: rank for rank, name in enumerate(COMMENT_COLUMN_NAMES)}
+
+# rows of the first chunk looked at to pick the comment column
+COLUMN_SAMPLE_ROWS = 200
+
+class ColumnNotFoundError(ValueError):
+    """The comment column the client asked for is not in the file"""
+
+def get_file_extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+def iter_chunks(filename, stream, chunk_rows=1000):
+    """
+    Read an uploaded CSV or Excel file as DataFrames of at most chunk_rows rows.
+
+    Args:
+        filename (str): Original file name, used to pick the reader
+        stream: Binary file object positioned at the start of the file
+        chunk_rows (int): Most rows per yielded DataFrame
+
+    Values are kept as the file has them, CSV and xls cells are read as
+    strings so leading zeros and blank cells survive into the stored results.
+
+    Yields:
+        pandas.DataFrame: The next chunk of rows, with the file's header as columns
+    """
+    file_ext = get_file_extension(filename)
+
+    if file_ext == 'csv':
+        yield from _iter_csv_chunks(stream, chunk_rows)
+    elif file_ext == 'xlsx':
+        yield from _iter_xlsx_chunks(stream, chunk_rows)
+    else:  # xls
+        df = pd.read_excel(stream, dtype=str, keep_default_na=False)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+def _iter_csv_chunks(stream, chunk_rows):
+    try:
+        reader = pd.read_csv(stream, chunksize=chunk_rows, dtype=str, keep_default_na=False)
+    except pd.errors.EmptyDataError:
+        return
+
+    with reader:
+        for chunk in reader:
+            if not chunk.empty:
+                yield chunk
+
+def _iter_xlsx_chunks(stream, chunk_rows):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        # same sheet pandas.read_excel reads by default
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+
+        columns = [str(name) if name is not None else f'Unnamed: {index}' for index, name in enumerate(header)]
+        width = len(columns)
+        buffer = []
+        for row in rows:
+            # read-only rows can be ragged, pad or trim them to the header
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            buffer.append(row)
+            if len(buffer) >= chunk_rows:
+                yield pd.DataFrame(buffer, columns=columns, dtype=object)
+                buffer = []
+
+        if buffer:
+            # object columns so integer columns with blank cells dont turn into floats
+            yield pd.DataFrame(buffer, columns=columns, dtype=object)
+    finally:
+        workbook.close()
+
+def count_rows(filename, stream):
+    """
+    Count an uploaded file's rows without parsing its cells, for progress reporting.
+
+    CSV records are counted with the csv module so quoted line breaks are
+    handled, xlsx files use the sheet's recorded dimensions and xls files
+    their row count. The stream is put back at the start of the file.
+
+    Returns:
+        int: Rows below the header, or None if they could not be counted
+    """
+    file_ext = get_file_extension(filename)
+    try:
+        if file_ext == 'csv':
+            text = io.TextIOWrapper(stream, encoding='utf-8', errors='replace', newline='')
+            try:
+                # blank lines are skipped like pandas does
+                records = sum(1 for record in csv.reader(text) if record)
+            finally:
+                # leave the binary stream open for the parser
+                text.detach()
+            return max(records - 1, 0)
+
+        if file_ext == 'xlsx':
+            from openpyxl import load_workbook
+
+            workbook = load_workbook(stream, read_only=True)
+            try:
+                max_row = workbook.worksheets[0].max_row
+            finally:
+                workbook.close()
+            return max(max_row - 1, 0) if max_row is not None else None
+
+        import xlrd
+
+        workbook = xlrd.open_workbook(file_contents=stream.read(), on_demand=True)
+        try:
+            return max(workbook.sheet_by_index(0).nrows - 1, 0)
+        finally:
+            workbook.release_resources()
+    except Exception as e:
+        logger.error(f"Could not count the rows of {filename}: {e}")
+        return None
+    finally:
+        stream.seek(0)
+
+def iter_upload_comments(files, chunk_rows=1000, max_workers=4, column=None):
+    """
+    Parse several uploaded files at once, yielding their comments chunk by chunk.
+
+    Each file is read by its own thread from a pool of max_workers, so files
+    are parsed at the same time as each other and as the caller works on the
+    chunks it already has. Chunks of one file arrive in order, chunks of
+    different files interleave. At most 2 * max_workers parsed chunks wait
+    for the caller. Files without a comment column yield nothing.
+
+    Args:
+        files (list): (filename, binary stream) pairs
+        chunk_rows (int): Most rows per chunk
+        max_workers (int): Most files parsed at the same time
+        column (str): Comment column to use instead of picking one, see find_comment_column
+
+    Yields:
+        tuple: (index of the file in files, its next chunk as a DataFrame, the file's
+        comment column, the chunk's comments, the positions in the chunk of the rows
+        the comments came from)
+    """
+    if not files:
+        return
+
+    chunks = queue.Queue(maxsize=2 * max_workers)
+    stop = threading.Event()
+
+    def put(item):
+        # give up once the caller has stopped reading
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def parse(file_index, filename, stream):
+        try:
+            comment_col = None
+            for chunk in iter_chunks(filename, stream, chunk_rows):
+                # pick the comment column from the first chunk, skip the file if there is none
+                if comment_col is None:
+                    comment_col = find_comment_column(chunk, column)
+                    if comment_col is None:
+                        break
+
+                comments, positions = extract_comments(chunk[comment_col])
+                if not put((file_index, (chunk, comment_col, comments, positions), None)):
+                    return
+        except Exception as e:
+            put((file_index, None, e))
+            return
+        # no chunk means the file is done
+        put((file_index, None, None))
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(files)), thread_name_prefix='upload-parser')
+    try:
+        for file_index, (filename, stream) in enumerate(files):
+            executor.submit(parse, file_index, filename, stream)
+
+        remaining = len(files)
+        while remaining:
+            file_index, parsed, error = chunks.get()
+            if error is not None:
+                logger.error(f"Error reading {files[file_index][0]}: {error}")
+                raise error
+            if parsed is None:
+                remaining -= 1
+                continue
+            yield (file_index, *parsed)
+    finally:
+        stop.set()
+        executor.shutdown(wait=False)
+
+def find_comment_column(df, column=None):
+    """
+    Pick the column holding the comments, or None if no column looks like text.
+
+    Only the header and the first COLUMN_SAMPLE_ROWS rows are looked at. Each
+    candidate column is scored on how well its name matches
+    COMMENT_COLUMN_NAMES, how long its values are and how much of them is
+    letters, so ID, date and code columns lose to free text even when they
+    come first.
+
+    Args:
+        df (DataFrame): The first chunk of the file
+        column (str): Column the client asked for, matched case-insensitively
+
+    Raises:
+        ColumnNotFoundError: If column is given and the file has no such column
+    """
+    if column:
+        wanted = column.strip().lower()
+        for actual_col in df.columns:
+            if str(actual_col).strip().lower() == wanted:
+                return actual_col
+        raise ColumnNotFoundError(
+            f"Column '{column}' not found, the file has: {', '.join(str(col) for col in df.columns)}"
+        )
+
+    sample = df.iloc[:COLUMN_SAMPLE_ROWS]
+    best_col = None
+    best_score = 0
+    for col in df.columns:
+        score = _column_score(str(col), sample[col])
+        if score > best_score:
+            best_col, best_score = col, score
+
+    return best_col
+
+def _column_score(name, values):
+    """Score how likely a column is to hold the comments, 0 if it can't"""
+    name = name.strip().lower()
+    if name in _COMMENT_NAME_RANKS:
+        # exact preferred names, earlier in the list scores higher
+        name_score = 3 - 0.2 * _COMMENT_NAME_RANKS[name]
+    elif any(comment_name in name for comment_name in COMMENT_COLUMN_NAMES):
+        name_score = 1
+    else:
+        name_score = 0
+
+    texts = [value.strip() for value in values if isinstance(value, str) and value.strip()]
+    if not texts:
+        # a named column still wins over nothing, like an empty comments column
+        return name_score
+
+    letters = sum(sum(char.isalpha() for char in text) for text in texts)
+    characters = sum(sum(not char.isspace() for char in text) for text in texts)
+    alpha_ratio = letters / characters if characters else 0
+    if alpha_ratio < 0.5 and not name_score:
+        return 0
+
+    average_length = sum(len(text) for text in texts) / len(texts)
+    filled = len(texts) / len(values)
+    return name_score + 2 * min(average_length, 80) / 80 + 2 * alpha_ratio + filled
+
+def dedup_key(comment):
+    """
+    Key that is the same for comments only differing in case or surrounding whitespace.
+
+    Same folding as the analysis cache. Whitespace inside a comment is kept, the
+    rules match phrases like 'not bad' on the exact text.
+    """
+    return normalize_text(comment)
+
+def extract_comments(column):
+    """Get the analyzable comments from a column, returns (comments, positions of their rows in the column)"""
+    comments = []
+    positions = []
+
+    # Use ALL rows, not just dropna() - handle NaN/null values as empty strings
+    for position, comment in enumerate(column):
+        # Convert any value to string and clean it
+        if pd.isna(comment) or comment is None:
+            comment_str = ""
+        else:
+            comment_str = str(comment).strip()
+
+        # Only skip if truly empty after conversion (minimum 2 characters for meaningful analysis)
+        if comment_str and len(comment_str) >= 2:
+            comments.append(comment_str)
+            positions.append(position)
+
+    return comments, positions
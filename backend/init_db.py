@@ -1,11 +1,17 @@
+import ast
+import json
+import logging
 import sqlite3
+from db import BUSY_TIMEOUT_MS, get_db
+
+# how long a starting worker waits for another one to finish a migration step
+MIGRATION_BUSY_TIMEOUT_MS = 120000
 
 def initialize_database():
+    conn = get_db()
     try:
-        # just connect to the db file - SQLite makes one if it does not exist
-        conn = sqlite3.connect('database.db')
         cursor = conn.cursor()
-        
+
         # create the users table with everything we need
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -19,25 +25,229 @@ def initialize_database():
                 reset_token TEXT
             )
         ''')
-        
+
         # try to add these columns in case we are updating an old database
         # dont want to break existing user data
         try:
             cursor.execute('ALTER TABLE users ADD COLUMN bio TEXT')
         except sqlite3.OperationalError:
             pass  # already exists, all good
-            
+
         try:
             cursor.execute('ALTER TABLE users ADD COLUMN avatar TEXT')
         except sqlite3.OperationalError:
             pass  # this one too
-        
-        conn.commit()
-        
+
+        # committed by the migration running this, see migrate
+
+    except Exception as e:
+        # let the migration roll back instead of recording a step that did not happen
+        logging.error(f"Database initialization error: {e}")
+        raise
+    finally:
+        conn.close()
+
+def create_baseline_tables(conn):
+    """Tables from before migrations were versioned, each step is safe to rerun"""
+    from routes.analytics import init_db as init_analytics_db
+    from routes.notes import init_db as init_notes_db
+    from routes.profile import init_db as init_profile_db
+
+    initialize_database()
+    init_notes_db()
+    init_profile_db()
+    init_analytics_db()
+
+def add_notes_user_index(conn):
+    # notes are always listed per user, newest first
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notes_user_created
+        ON notes (user_id, created_at DESC)
+    ''')
+
+def normalize_profile_stats(conn):
+    """Move the note count and recent activity out of the profiles JSON columns"""
+    conn.execute('ALTER TABLE profiles ADD COLUMN note_count INTEGER NOT NULL DEFAULT 0')
+    conn.execute('''
+        UPDATE profiles SET note_count = (
+            SELECT COUNT(*) FROM notes WHERE notes.user_id = profiles.user_id
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS profile_activity (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            description TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_profile_activity_user
+        ON profile_activity (user_id, id)
+    ''')
+
+    # copy over the stored activity, oldest first so ids keep the order
+    for row in conn.execute('SELECT user_id, recent_activity FROM profiles').fetchall():
+        activities = parse_stored_value(row['recent_activity'])
+        if not isinstance(activities, list):
+            continue
+        conn.executemany(
+            'INSERT INTO profile_activity (user_id, description, created_at) VALUES (?, ?, ?)',
+            [(row['user_id'], activity.get('description', ''), activity.get('time', ''))
+             for activity in reversed(activities) if isinstance(activity, dict)]
+        )
+
+def move_activities_to_table(conn):
+    """Move the analytics activity list out of each users analytics.json"""
+    from routes.analytics import read_data_file
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_activity (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            type TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_analysis_activity_user
+        ON analysis_activity (user_id, id)
+    ''')
+
+    # the json lists are newest first, insert oldest first so ids keep the order
+    for row in conn.execute('SELECT id FROM users').fetchall():
+        try:
+            data = read_data_file(row['id']) or {}
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not read analytics for user {row['id']}: {e}")
+            continue
+        conn.executemany(
+            'INSERT INTO analysis_activity (user_id, title, description, type, created_at) VALUES (?, ?, ?, ?, ?)',
+            [(row['id'], activity.get('title', ''), activity.get('description', ''),
+              activity.get('type', 'info'), activity.get('time', ''))
+             for activity in reversed(data.get('activities', [])) if isinstance(activity, dict)]
+        )
+
+def add_activity_archive(conn):
+    """Count each users activities and add the table old activities are archived to"""
+    conn.execute('ALTER TABLE user_analytics ADD COLUMN activity_count INTEGER NOT NULL DEFAULT 0')
+    conn.execute('''
+        UPDATE user_analytics SET activity_count = (
+            SELECT COUNT(*) FROM analysis_activity WHERE analysis_activity.user_id = user_analytics.user_id
+        )
+    ''')
+
+    # same columns as analysis_activity, rows keep their original id
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_activity_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            type TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_analysis_activity_archive_user
+        ON analysis_activity_archive (user_id, id)
+    ''')
+
+def add_bulk_jobs(conn):
+    """Keep background job status where every worker process can see it"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS bulk_jobs (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            description TEXT NOT NULL,
+            status TEXT NOT NULL,
+            total_rows INTEGER NOT NULL DEFAULT 0,
+            processed_rows INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            result JSON,
+            error TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_bulk_jobs_finished
+        ON bulk_jobs (finished_at)
+    ''')
+
+def add_job_heartbeat(conn):
+    """Record when a job's worker last checked in, jobs of workers that died are failed from it"""
+    conn.execute('ALTER TABLE bulk_jobs ADD COLUMN updated_at REAL')
+    conn.execute('UPDATE bulk_jobs SET updated_at = COALESCE(finished_at, started_at, created_at)')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_bulk_jobs_status
+        ON bulk_jobs (status, updated_at)
+    ''')
+
+def parse_stored_value(value):
+    """Decode a profiles JSON column, older rows hold a Python repr instead of JSON"""
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        try:
+            return ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            return None
+
+# schema changes in the order they were made, never edit or reorder released steps
+# PRAGMA user_version records how many of them a database has had applied
+MIGRATIONS = [
+    create_baseline_tables,
+    add_notes_user_index,
+    normalize_profile_stats,
+    move_activities_to_table,
+    add_activity_archive,
+    add_bulk_jobs,
+    add_job_heartbeat,
+]
+
+def migrate():
+    """
+    Apply the migrations a database has not had yet, run once when the app starts.
+
+    Every gunicorn worker runs this as it starts, so each step runs in its own
+    BEGIN IMMEDIATE transaction together with its user_version bump. The
+    version is read again once the write lock is held, so a step another
+    worker has just applied is skipped instead of run twice.
+    """
+    conn = get_db()
+    try:
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= len(MIGRATIONS):
+            return
+
+        # a worker waits for the one applying a step rather than giving up after the usual timeout
+        conn.execute(f'PRAGMA busy_timeout = {MIGRATION_BUSY_TIMEOUT_MS}')
+        for number, migration in enumerate(MIGRATIONS, start=1):
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute('PRAGMA user_version').fetchone()[0] < number:
+                    migration(conn)
+                    conn.execute(f'PRAGMA user_version = {number}')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
     except Exception as e:
-        pass
+        logging.error(f"Database migration failed: {e}")
+        raise
     finally:
+        conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
         conn.close()
 
 if __name__ == "__main__":
-    initialize_database() 
\ No newline at end of file
+    migrate()
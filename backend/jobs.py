@@ -0,0 +1,342 @@
+"""
+Background job queue for long running analyses.
+
+Jobs run on a small thread pool so the request that submits them can return
+straight away. Each job's status and progress counters live in the bulk_jobs
+table rather than in the process running it, so any worker can answer a poll
+or a cancel for a job another worker accepted. The running job writes its
+counters back, and picks up a cancel, at most every PROGRESS_INTERVAL
+seconds. Only a small result summary is kept with a job, callers store
+anything bigger elsewhere.
+
+Each process also stamps updated_at on the jobs it holds every
+HEARTBEAT_INTERVAL seconds, however long a job goes between progress
+updates. A queued or running job nobody has stamped for stale_seconds
+belonged to a worker that died or was restarted, it is failed the next time
+it is polled or a job is submitted, and then pruned like any finished job.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from db import get_db
+
+logger = logging.getLogger(__name__)
+
+# seconds between a running job's writes of its progress to bulk_jobs
+PROGRESS_INTERVAL = 1.0
+
+# seconds between a process's updated_at stamps on the jobs it holds
+HEARTBEAT_INTERVAL = 10
+
+# error recorded for a job whose worker stopped checking in
+WORKER_LOST = 'worker lost'
+
+class JobCancelled(Exception):
+    """Raised inside a job function once the job has been cancelled."""
+
+class Job:
+    def __init__(self, job_id, user_id, description='', status='queued', total_rows=0, processed_rows=0,
+                 created_at=None, started_at=None, finished_at=None, result=None, error=None,
+                 cancel_requested=False):
+        self.id = job_id
+        self.user_id = user_id
+        self.description = description
+        self.status = status
+        self.total_rows = total_rows
+        self.processed_rows = processed_rows
+        self.created_at = created_at or time.time()
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.result = result
+        self.error = error
+        self.cancel_requested = cancel_requested
+        self._lock = threading.Lock()
+        self._synced_at = 0
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            row['id'], row['user_id'], row['description'], row['status'], row['total_rows'],
+            row['processed_rows'], row['created_at'], row['started_at'], row['finished_at'],
+            json.loads(row['result']) if row['result'] else None, row['error'], bool(row['cancel_requested'])
+        )
+
+    @property
+    def cancelled(self):
+        return self.cancel_requested
+
+    def cancel(self):
+        """Ask the job to stop at its next checkpoint, whichever worker is running it."""
+        conn = get_db()
+        try:
+            # a job still queued never starts, a running one sees the flag at its next sync
+            conn.execute(
+                """UPDATE bulk_jobs SET cancel_requested = 1,
+                       status = CASE WHEN status = 'queued' THEN 'cancelled' ELSE status END,
+                       finished_at = CASE WHEN status = 'queued' THEN ? ELSE finished_at END
+                   WHERE id = ?""",
+                (time.time(), self.id)
+            )
+            conn.commit()
+            row = conn.execute("SELECT status, finished_at FROM bulk_jobs WHERE id = ?", (self.id,)).fetchone()
+        finally:
+            conn.close()
+        self.cancel_requested = True
+        if row is not None:
+            self.status, self.finished_at = row['status'], row['finished_at']
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job has been cancelled."""
+        self._sync()
+        if self.cancelled:
+            raise JobCancelled()
+
+    def add_total(self, rows):
+        with self._lock:
+            self.total_rows += rows
+        self._sync()
+
+    def advance(self, rows):
+        with self._lock:
+            self.processed_rows += rows
+        self._sync()
+
+    def _sync(self, force=False):
+        """Write the counters to bulk_jobs and read back whether the job was cancelled"""
+        if not force and time.time() - self._synced_at < PROGRESS_INTERVAL:
+            return
+        self._synced_at = time.time()
+
+        with self._lock:
+            total_rows, processed_rows = self.total_rows, self.processed_rows
+        conn = get_db()
+        try:
+            conn.execute(
+                "UPDATE bulk_jobs SET total_rows = ?, processed_rows = ?, updated_at = ? WHERE id = ?",
+                (total_rows, processed_rows, self._synced_at, self.id)
+            )
+            conn.commit()
+            row = conn.execute("SELECT cancel_requested FROM bulk_jobs WHERE id = ?", (self.id,)).fetchone()
+        finally:
+            conn.close()
+        self.cancel_requested = bool(row and row['cancel_requested'])
+
+    @property
+    def finished(self):
+        return self.status in ('completed', 'failed', 'cancelled')
+
+    def progress(self):
+        """
+        Return the job status with rows done/total, throughput and ETA.
+
+        A running job with no total yet could not count its rows up front,
+        its totalRows, percent and ETA are None until it finishes.
+        """
+        with self._lock:
+            now = self.finished_at or time.time()
+            elapsed = now - self.started_at if self.started_at else 0
+            rows_per_second = self.processed_rows / elapsed if elapsed > 0 else 0
+            total_rows = self.total_rows if self.total_rows or self.finished else None
+            if self.finished:
+                eta = 0
+            elif rows_per_second > 0 and total_rows is not None:
+                eta = max(total_rows - self.processed_rows, 0) / rows_per_second
+            else:
+                eta = None
+            if not total_rows:
+                percent = 100 if self.finished else (0 if total_rows is not None else None)
+            else:
+                # the total is counted up front and can be a little off
+                percent = min(round(self.processed_rows * 100 / total_rows, 1), 100)
+
+            return {
+                'jobId': self.id,
+                'status': self.status,
+                'description': self.description,
+                'processedRows': self.processed_rows,
+                'totalRows': total_rows,
+                'percent': percent,
+                'rowsPerSecond': round(rows_per_second, 2),
+                'etaSeconds': round(eta, 1) if eta is not None else None,
+                'elapsedSeconds': round(elapsed, 2),
+                'error': self.error
+            }
+
+class JobManager:
+    def __init__(self, max_workers=2, retention_seconds=3600, stale_seconds=120):
+        """
+        Args:
+            max_workers (int): Number of jobs that run at the same time in this process
+            retention_seconds (int): How long finished jobs are kept for polling
+            stale_seconds (int): How long a queued or running job can go without a heartbeat
+                before it is failed as lost, keep it well above HEARTBEAT_INTERVAL
+        """
+        self.retention_seconds = retention_seconds
+        self.stale_seconds = stale_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+        # ids of the jobs queued or running in this process
+        self._active = set()
+        self._active_lock = threading.Lock()
+        self._heartbeat_pid = None
+
+    def submit(self, user_id, func, *args, description='', cleanup=None):
+        """
+        Queue func(job, *args) to run in the background.
+
+        Args:
+            user_id: Owner of the job, only they can see it
+            func (callable): Does the work and returns the job result, a small JSON serializable dict
+            description (str): Short human readable label
+            cleanup (callable): Called once the job has finished, whatever the outcome
+
+        Returns:
+            Job: The queued job
+        """
+        job = Job(uuid.uuid4().hex, user_id, description)
+        conn = get_db()
+        try:
+            self._fail_stale(conn)
+            self._prune(conn)
+            conn.execute(
+                """INSERT INTO bulk_jobs (id, user_id, description, status, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (job.id, user_id, description, job.status, job.created_at, job.created_at)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        self._start_heartbeat()
+        with self._active_lock:
+            self._active.add(job.id)
+        self._executor.submit(self._run, job, func, args, cleanup)
+        return job
+
+    def _start_heartbeat(self):
+        # started in the process that runs the jobs, not a master it was forked from
+        with self._active_lock:
+            if self._heartbeat_pid == os.getpid():
+                return
+            self._heartbeat_pid = os.getpid()
+        threading.Thread(target=self._heartbeat, name='analysis-job-heartbeat', daemon=True).start()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._active_lock:
+                job_ids = list(self._active)
+            if not job_ids:
+                continue
+            try:
+                conn = get_db()
+                try:
+                    conn.execute(
+                        f"UPDATE bulk_jobs SET updated_at = ? WHERE id IN ({', '.join('?' * len(job_ids))})",
+                        (time.time(), *job_ids)
+                    )
+                    conn.commit()
+                finally:
+                    conn.close()
+            except Exception as e:
+                logger.error(f"Job heartbeat failed: {e}")
+
+    def _finish(self, job, status, result=None, error=None):
+        with job._lock:
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+            if status == 'completed':
+                # every row was read, including ones the count up front missed
+                job.total_rows = job.processed_rows = max(job.total_rows, job.processed_rows)
+            values = (status, job.total_rows, job.processed_rows, job.finished_at,
+                      json.dumps(result) if result is not None else None, error, job.finished_at, job.id)
+        conn = get_db()
+        try:
+            conn.execute(
+                """UPDATE bulk_jobs SET status = ?, total_rows = ?, processed_rows = ?, finished_at = ?,
+                       result = ?, error = ?, updated_at = ?
+                   WHERE id = ?""",
+                values
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _run(self, job, func, args, cleanup):
+        try:
+            job.started_at = time.time()
+            conn = get_db()
+            try:
+                # the job may have been cancelled while it was queued
+                started = conn.execute(
+                    """UPDATE bulk_jobs SET status = 'running', started_at = ?, updated_at = ?
+                       WHERE id = ? AND status = 'queued'""",
+                    (job.started_at, job.started_at, job.id)
+                ).rowcount
+                conn.commit()
+            finally:
+                conn.close()
+            if not started:
+                return
+            job.status = 'running'
+
+            result = func(job, *args)
+            self._finish(job, 'completed', result=result)
+        except JobCancelled:
+            self._finish(job, 'cancelled')
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            try:
+                self._finish(job, 'failed', error=str(e))
+            except Exception as finish_error:
+                logger.error(f"Could not record job {job.id} failure: {finish_error}")
+        finally:
+            with self._active_lock:
+                self._active.discard(job.id)
+            if cleanup:
+                try:
+                    cleanup()
+                except Exception as e:
+                    logger.error(f"Job {job.id} cleanup failed: {e}")
+
+    def get(self, job_id, user_id):
+        """Return the job if it exists and belongs to user_id, else None."""
+        conn = get_db()
+        try:
+            row = conn.execute("SELECT * FROM bulk_jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is not None and row['status'] in ('queued', 'running') and self._is_stale(row['updated_at'] or row['created_at']):
+                self._fail_stale(conn, job_id)
+                row = conn.execute("SELECT * FROM bulk_jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None or str(row['user_id']) != str(user_id):
+            return None
+        return Job.from_row(row)
+
+    def _is_stale(self, updated_at):
+        return updated_at < time.time() - self.stale_seconds
+
+    def _fail_stale(self, conn, job_id=None):
+        """Fail queued and running jobs, or just job_id, whose worker stopped sending heartbeats"""
+        now = time.time()
+        query = """UPDATE bulk_jobs SET status = 'failed', error = ?, finished_at = ?, updated_at = ?
+                   WHERE status IN ('queued', 'running') AND COALESCE(updated_at, created_at) < ?"""
+        params = (WORKER_LOST, now, now, now - self.stale_seconds)
+        if job_id is not None:
+            query += " AND id = ?"
+            params += (job_id,)
+        failed = conn.execute(query, params).rowcount
+        conn.commit()
+        if failed:
+            logger.error(f"Failed {failed} bulk jobs whose worker was lost")
+
+    def _prune(self, conn):
+        conn.execute(
+            "DELETE FROM bulk_jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+            (time.time() - self.retention_seconds,)
+        )
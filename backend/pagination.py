@@ -0,0 +1,50 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A page is fetched with WHERE (sort key) < (last key seen) ... LIMIT n, so each
+page costs the same indexed range scan however deep into the history it is.
+The cursor handed to clients is the last row's sort key, base64 encoded so it
+stays opaque.
+"""
+import base64
+import json
+
+from flask import request
+
+# response header holding the cursor of the next page, absent on the last page
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor):
+    """Get the sort key values back from a cursor, raises ValueError if it is malformed"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+def get_page_args(default_limit, max_limit):
+    """
+    Read the limit and cursor query parameters.
+
+    Returns:
+        tuple: (limit, cursor values or None), raises ValueError for a bad cursor
+    """
+    limit = min(max(request.args.get('limit', default_limit, type=int), 1), max_limit)
+    cursor = request.args.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+def paginated_response(response, rows, limit, cursor_of):
+    """
+    Set the next page cursor on a response.
+
+    rows is the result of a query with LIMIT limit + 1, the extra row only
+    tells whether there is another page.
+    """
+    if len(rows) > limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*cursor_of(rows[limit - 1]))
+    return response
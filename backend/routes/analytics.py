@@ -1,12 +1,16 @@
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from datetime import datetime, timedelta
-import random
 import logging
 import os
 import json
-import sqlite3
-import re
+import hashlib
+import time
+from db import get_db
+from identity import current_user_id
+from pagination import get_page_args, paginated_response
+from ingest import ColumnNotFoundError, count_rows, iter_upload_comments, dedup_key
+from bulk_results import UploadResultsWriter, load_manifest, iter_csv, read_results, stored_file_path
 
 analytics = Blueprint('analytics', __name__)
 
@@ -16,122 +20,479 @@ DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
 # ensure data directory exists
 os.makedirs(DATA_DIR, exist_ok=True)
 
-# default data structure
-DEFAULT_DATA = {
-    'totalAnalyses': 0,
-    'bulkUploads': 0,
-    'averageSentiment': 75,
-    'lastAnalysisTime': None,
-    'emotionCounts': {
-        'Joy': 0,
-        'Sadness': 0,
-        'Anger': 0,
-        'Fear': 0,
-        'Surprise': 0,
-        'Love': 0,
-        'neutral': 0
-    },
-    'activities': [
-        {
-            'title': 'Welcome to Sunsights',
-            'description': 'Your sentiment analysis dashboard is ready',
-            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'type': 'info'
-        }
-    ]
-}
+# emotion categories shown on the dashboard, anything else counts as neutral
+EMOTION_LABELS = ['Joy', 'Sadness', 'Anger', 'Fear', 'Surprise', 'Love', 'neutral']
 
-def get_db():
-    try:
-        db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database.db')
+# rollup granularities, with how much of the created_at timestamp identifies a bucket
+BUCKET_PREFIX_LENGTHS = {'hour': 13, 'day': 10}
 
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-    except Exception as e:
-        logging.error(f"Database connection error: {e}")
-        raise
+PRIORITY_LABELS = ['High', 'Medium', 'Low']
+
+# activities per page of /activity and on the dashboard
+ACTIVITY_PAGE_SIZE = 20
+ACTIVITY_MAX_PAGE_SIZE = 100
 
-def get_user_id_from_email(email):
-    """Get user ID from email"""
+def init_db():
     try:
         conn = get_db()
         cursor = conn.cursor()
-        user = cursor.execute(
-            "SELECT id FROM users WHERE email = ?",
-            (email,)
-        ).fetchone()
         
-        if user:
-            # convert the id to a string to ensure compatibility with file paths
-            return str(user['id'])
-        return None
+        # one row per analyzed text
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS analysis_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                sentiment TEXT,
+                sentiment_score REAL,
+                emotion TEXT,
+                priority TEXT,
+                source TEXT NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_analysis_events_user_created
+            ON analysis_events (user_id, created_at)
+        ''')
+        
+        # running totals, updated with each batch of events
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_analytics (
+                user_id INTEGER PRIMARY KEY,
+                total_analyses INTEGER NOT NULL DEFAULT 0,
+                bulk_uploads INTEGER NOT NULL DEFAULT 0,
+                sentiment_total REAL NOT NULL DEFAULT 0,
+                last_analysis_time TEXT,
+                revision INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_emotion_counts (
+                user_id INTEGER NOT NULL,
+                emotion TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, emotion)
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_priority_counts (
+                user_id INTEGER NOT NULL,
+                priority TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, priority)
+            )
+        ''')
+        
+        # per hour and per day rollups of analysis_events, filled at write time
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS analysis_buckets (
+                user_id INTEGER NOT NULL,
+                granularity TEXT NOT NULL,
+                bucket_start TEXT NOT NULL,
+                total INTEGER NOT NULL DEFAULT 0,
+                positive INTEGER NOT NULL DEFAULT 0,
+                negative INTEGER NOT NULL DEFAULT 0,
+                sentiment_total REAL NOT NULL DEFAULT 0,
+                high INTEGER NOT NULL DEFAULT 0,
+                medium INTEGER NOT NULL DEFAULT 0,
+                low INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, granularity, bucket_start)
+            )
+        ''')
+        # committed by the migration running this, see init_db.migrate
+    
     except Exception as e:
-        logging.error(f"Error getting user ID: {str(e)}")
-        return None
+        logging.error(f"Database initialization error: {e}")
+        raise
     finally:
-        if conn:
-            conn.close()
+        conn.close()
 
-def get_data_file_for_user(user_id):
-    """Get data file path for specific user"""
-    if user_id is None:
-        return os.path.join(DATA_DIR, 'default_analytics_data.json')
-    return os.path.join(DATA_DIR, f'user_{user_id}_analytics_data.json')
+def normalize_emotion(emotion):
+    """Map a model emotion label onto one of the dashboard categories"""
+    emotion_key = (emotion or '').capitalize()
+    return emotion_key if emotion_key in EMOTION_LABELS else 'neutral'
 
-def load_data(user_id=None):
-    """Load analytics data from file for specific user or create with defaults if it doesn't exist"""
+def normalize_priority(priority):
+    """Title case a priority, the rules return 'low' for texts that could not be analyzed"""
+    return (priority or '').capitalize() or None
+
+def ensure_user_analytics(conn, user_id):
+    """
+    Create the users counter row if it is missing.
+    
+    Counters from an existing analytics.json are copied over the first time,
+    so accounts created before the event store keep their totals. Brand new
+    accounts get the welcome activity instead.
+    """
+    if conn.execute("SELECT 1 FROM user_analytics WHERE user_id = ?", (user_id,)).fetchone():
+        return
+    
+    legacy_data = read_data_file(user_id)
+    new_account = legacy_data is None
+    legacy_data = legacy_data or {}
+    
+    total_analyses = legacy_data.get('totalAnalyses', 0)
+    # activities migrated from analytics.json are already in analysis_activity, count them from the start
+    cursor = conn.execute(
+        """INSERT OR IGNORE INTO user_analytics
+           (user_id, total_analyses, bulk_uploads, sentiment_total, last_analysis_time, activity_count)
+           VALUES (?, ?, ?, ?, ?, (SELECT COUNT(*) FROM analysis_activity WHERE user_id = ?))""",
+        (
+            user_id,
+            total_analyses,
+            legacy_data.get('bulkUploads', 0),
+            legacy_data.get('averageSentiment', 75) * total_analyses,
+            legacy_data.get('lastAnalysisTime'),
+            user_id
+        )
+    )
+    
+    # another request may have seeded the row first
+    if cursor.rowcount:
+        conn.executemany(
+            "INSERT OR IGNORE INTO user_emotion_counts (user_id, emotion, count) VALUES (?, ?, ?)",
+            [(user_id, emotion, count) for emotion, count in legacy_data.get('emotionCounts', {}).items() if count]
+        )
+        if new_account:
+            insert_activity(conn, user_id, {
+                'title': 'Welcome to Sunsights',
+                'description': 'Your sentiment analysis dashboard is ready',
+                'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'type': 'info'
+            })
+    conn.commit()
+
+def get_user_counters(user_id):
+    """Return the users analytics counters in the analytics.json field names"""
+    conn = get_db()
     try:
-        # make sure user_id is a string
-        if user_id is not None:
-            user_id = str(user_id)
-        
-        # create user directory if it doesnt exist
-        user_dir = os.path.join(DATA_DIR, user_id)
-        os.makedirs(user_dir, exist_ok=True)
-        
-        # path to users analytics data file
-        data_file = os.path.join(user_dir, 'analytics.json')
-        
-        # if file doesnt exist, create it with default structure
-        if not os.path.exists(data_file):
-            default_data = {
-                'totalAnalyses': 0,
-                'bulkUploads': 0,
-                'averageSentiment': 75,
-                'lastAnalysisTime': None,
-                'emotionCounts': {
-                    'Joy': 0,
-                    'Sadness': 0,
-                    'Anger': 0,
-                    'Fear': 0,
-                    'Surprise': 0,
-                    'Love': 0,
-                    'neutral': 0
-                },
-                'activities': [
-                    {
-                        'title': 'Welcome to Sunsights',
-                        'description': 'Your sentiment analysis dashboard is ready',
-                        'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                        'type': 'info'
-                    }
-                ],
-                'isNewAccount': True  # flag to identify new accounts
-            }
-            with open(data_file, 'w') as f:
-                json.dump(default_data, f)
-            return default_data
+        ensure_user_analytics(conn, user_id)
+        row = conn.execute(
+            "SELECT total_analyses, bulk_uploads, sentiment_total, last_analysis_time FROM user_analytics WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+        emotion_counts = {emotion: 0 for emotion in EMOTION_LABELS}
+        for emotion_row in conn.execute(
+            "SELECT emotion, count FROM user_emotion_counts WHERE user_id = ?",
+            (user_id,)
+        ):
+            emotion_counts[emotion_row['emotion']] = emotion_row['count']
+    finally:
+        conn.close()
+    
+    total_analyses = row['total_analyses']
+    return {
+        'totalAnalyses': total_analyses,
+        'bulkUploads': row['bulk_uploads'],
+        'averageSentiment': row['sentiment_total'] / total_analyses if total_analyses else 75,
+        'lastAnalysisTime': row['last_analysis_time'],
+        'emotionCounts': emotion_counts,
+        'isNewAccount': total_analyses == 0
+    }
+
+def record_analyses(user_id, results, source, bulk_uploads=0):
+    """
+    Store analysis results as events and add them to the users counters.
+    
+    Args:
+        user_id (str): The user the analyses belong to
+        results (list): Analysis results with sentiment, sentiment_score, emotion and priority
+        source (str): Where the texts came from, 'single' or 'bulk'
+        bulk_uploads (int): Bulk uploads to add to the counter
+    """
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    emotion_counts = {}
+    priority_counts = {}
+    for result in results:
+        emotion_key = normalize_emotion(result.get('emotion'))
+        emotion_counts[emotion_key] = emotion_counts.get(emotion_key, 0) + 1
+        priority = normalize_priority(result.get('priority'))
+        if priority:
+            priority_counts[priority] = priority_counts.get(priority, 0) + 1
+    
+    conn = get_db()
+    try:
+        ensure_user_analytics(conn, user_id)
+        conn.executemany(
+            """INSERT INTO analysis_events
+               (user_id, created_at, sentiment, sentiment_score, emotion, priority, source)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            [
+                (user_id, now, result['sentiment'].title(), result['sentiment_score'],
+                 result.get('emotion'), normalize_priority(result.get('priority')), source)
+                for result in results
+            ]
+        )
+        conn.execute(
+            """UPDATE user_analytics SET
+                   total_analyses = total_analyses + ?,
+                   bulk_uploads = bulk_uploads + ?,
+                   sentiment_total = sentiment_total + ?,
+                   last_analysis_time = CASE WHEN ? > 0 THEN ? ELSE last_analysis_time END,
+                   revision = revision + 1
+               WHERE user_id = ?""",
+            (
+                len(results),
+                bulk_uploads,
+                sum(result['sentiment_score'] for result in results),
+                len(results), now,
+                user_id
+            )
+        )
+        conn.executemany(
+            """INSERT INTO user_emotion_counts (user_id, emotion, count) VALUES (?, ?, ?)
+               ON CONFLICT (user_id, emotion) DO UPDATE SET count = count + excluded.count""",
+            [(user_id, emotion, count) for emotion, count in emotion_counts.items()]
+        )
+        conn.executemany(
+            """INSERT INTO user_priority_counts (user_id, priority, count) VALUES (?, ?, ?)
+               ON CONFLICT (user_id, priority) DO UPDATE SET count = count + excluded.count""",
+            [(user_id, priority, count) for priority, count in priority_counts.items()]
+        )
+        if results:
+            update_buckets(conn, user_id, now, results)
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_bucket_start(timestamp, granularity):
+    """Start of the hour or day bucket a '%Y-%m-%d %H:%M:%S' timestamp falls in"""
+    if granularity == 'hour':
+        return timestamp[:BUCKET_PREFIX_LENGTHS['hour']] + ':00'
+    return timestamp[:BUCKET_PREFIX_LENGTHS['day']]
+
+def update_buckets(conn, user_id, timestamp, results):
+    """Add results analyzed at timestamp to the users hourly and daily rollups"""
+    sentiments = [result['sentiment'].title() for result in results]
+    priorities = [normalize_priority(result.get('priority')) for result in results]
+    counts = (
+        len(results),
+        sentiments.count('Positive'),
+        sentiments.count('Negative'),
+        sum(result['sentiment_score'] for result in results),
+        priorities.count('High'),
+        priorities.count('Medium'),
+        priorities.count('Low')
+    )
+    conn.executemany(
+        """INSERT INTO analysis_buckets
+           (user_id, granularity, bucket_start, total, positive, negative, sentiment_total, high, medium, low)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT (user_id, granularity, bucket_start) DO UPDATE SET
+               total = total + excluded.total,
+               positive = positive + excluded.positive,
+               negative = negative + excluded.negative,
+               sentiment_total = sentiment_total + excluded.sentiment_total,
+               high = high + excluded.high,
+               medium = medium + excluded.medium,
+               low = low + excluded.low""",
+        [(user_id, granularity, get_bucket_start(timestamp, granularity)) + counts
+         for granularity in BUCKET_PREFIX_LENGTHS]
+    )
+
+def get_sentiment_series(user_id, time_range):
+    """
+    Read the positive and negative share of each bucket in a time range.
+    
+    24h uses hourly buckets, longer ranges use daily buckets, so the cost
+    depends on the number of buckets rather than the number of analyses.
+    
+    Returns:
+        tuple: (labels, positive percentages, negative percentages)
+    """
+    now = datetime.now()
+    if time_range == '24h':
+        granularity = 'hour'
+        starts = [(now - timedelta(hours=hours)).strftime('%Y-%m-%d %H:00') for hours in range(23, -1, -1)]
+    else:
+        granularity = 'day'
+        starts = generate_timestamps(get_days_from_range(time_range))
+    
+    conn = get_db()
+    try:
+        rows = conn.execute(
+            """SELECT bucket_start, total, positive, negative FROM analysis_buckets
+               WHERE user_id = ? AND granularity = ? AND bucket_start >= ?""",
+            (user_id, granularity, starts[0])
+        ).fetchall()
+    finally:
+        conn.close()
+    buckets = {row['bucket_start']: row for row in rows}
+    
+    positive_data = []
+    negative_data = []
+    for start in starts:
+        bucket = buckets.get(start)
+        if bucket and bucket['total']:
+            positive_data.append(round(bucket['positive'] * 100 / bucket['total'], 1))
+            negative_data.append(round(bucket['negative'] * 100 / bucket['total'], 1))
+        else:
+            positive_data.append(0)
+            negative_data.append(0)
+    
+    # show just the time of day for hourly buckets
+    labels = [start[11:] for start in starts] if granularity == 'hour' else starts
+    return labels, positive_data, negative_data
+
+def get_priority_counts(user_id, time_range=None):
+    """
+    Count the users analyses per priority.
+    
+    Without a time range this reads the users running totals. With one it sums
+    the hourly (24h) or daily rollups in the range.
+    
+    Returns:
+        dict: Count per priority label
+    """
+    priorities_count = {priority: 0 for priority in PRIORITY_LABELS}
+    conn = get_db()
+    try:
+        if time_range is None:
+            rows = conn.execute(
+                "SELECT priority, count FROM user_priority_counts WHERE user_id = ?",
+                (user_id,)
+            ).fetchall()
+            for row in rows:
+                if row['priority'] in priorities_count:
+                    priorities_count[row['priority']] = row['count']
+        else:
+            if time_range == '24h':
+                granularity = 'hour'
+                start = (datetime.now() - timedelta(hours=23)).strftime('%Y-%m-%d %H:00')
+            else:
+                granularity = 'day'
+                start = generate_timestamps(get_days_from_range(time_range))[0]
+            row = conn.execute(
+                """SELECT COALESCE(SUM(high), 0) AS high, COALESCE(SUM(medium), 0) AS medium, COALESCE(SUM(low), 0) AS low
+                   FROM analysis_buckets WHERE user_id = ? AND granularity = ? AND bucket_start >= ?""",
+                (user_id, granularity, start)
+            ).fetchone()
+            for priority in PRIORITY_LABELS:
+                priorities_count[priority] = row[priority.lower()]
+    finally:
+        conn.close()
+    
+    return priorities_count
+
+def get_range_label(time_range):
+    """Chart label for a timeRange value"""
+    if time_range is None:
+        return 'All Time'
+    if time_range == '24h':
+        return 'Last 24 Hours'
+    return f"Last {get_days_from_range(time_range)} Days"
+
+def get_revision(user_id):
+    """Number that changes whenever the users analytics change, 0 before their first analysis"""
+    conn = get_db()
+    try:
+        row = conn.execute("SELECT revision FROM user_analytics WHERE user_id = ?", (user_id,)).fetchone()
+    finally:
+        conn.close()
+    return row['revision'] if row else 0
+
+def insert_activity(conn, user_id, activity):
+    conn.execute(
+        "INSERT INTO analysis_activity (user_id, title, description, type, created_at) VALUES (?, ?, ?, ?, ?)",
+        (user_id, activity['title'], activity['description'], activity['type'], activity['time'])
+    )
+    conn.execute("UPDATE user_analytics SET activity_count = activity_count + 1 WHERE user_id = ?", (user_id,))
+
+def archive_activities(conn, user_id, keep):
+    """Move all but the newest keep activities of a user to analysis_activity_archive"""
+    oldest_kept = conn.execute(
+        "SELECT id FROM analysis_activity WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+        (user_id, keep - 1)
+    ).fetchone()
+    if oldest_kept is None:
+        return
+    
+    conn.execute(
+        """INSERT INTO analysis_activity_archive (id, user_id, title, description, type, created_at)
+           SELECT id, user_id, title, description, type, created_at FROM analysis_activity
+           WHERE user_id = ? AND id < ?""",
+        (user_id, oldest_kept['id'])
+    )
+    archived = conn.execute(
+        "DELETE FROM analysis_activity WHERE user_id = ? AND id < ?", (user_id, oldest_kept['id'])
+    ).rowcount
+    conn.execute(
+        "UPDATE user_analytics SET activity_count = activity_count - ? WHERE user_id = ?", (archived, user_id)
+    )
+
+def add_activity(user_id, activity):
+    """
+    Add an activity to the top of the users activity list.
+    
+    The list keeps the newest ACTIVITY_RETENTION activities. Older ones are
+    moved to the archive table in batches of ACTIVITY_ARCHIVE_BATCH, so most
+    calls are a single insert and the list never grows past the cap plus one batch.
+    """
+    from app import app
+    retention = app.config['ACTIVITY_RETENTION']
+    
+    conn = get_db()
+    try:
+        ensure_user_analytics(conn, user_id)
+        insert_activity(conn, user_id, activity)
+        conn.execute("UPDATE user_analytics SET revision = revision + 1 WHERE user_id = ?", (user_id,))
         
-        # load existing data
-        with open(data_file, 'r') as f:
-            data = json.load(f)
-            
-        # if this is the first time loading data, mark it as not a new account
-        if 'isNewAccount' not in data:
-            data['isNewAccount'] = False
-            
-        return data
+        activity_count = conn.execute(
+            "SELECT activity_count FROM user_analytics WHERE user_id = ?", (user_id,)
+        ).fetchone()['activity_count']
+        if activity_count > retention + app.config['ACTIVITY_ARCHIVE_BATCH']:
+            archive_activities(conn, user_id, retention)
+        conn.commit()
+    finally:
+        conn.close()
+
+def get_activities(user_id, limit, before_id=None):
+    """
+    Read the users activities newest first, at most limit + 1 so callers can tell if there are more.
+    
+    Args:
+        user_id: The user to read activities for
+        limit (int): Page size
+        before_id (int): Only return activities older than this activity id
+    """
+    conn = get_db()
+    try:
+        ensure_user_analytics(conn, user_id)
+        rows = conn.execute(
+            """SELECT id, title, description, type, created_at FROM analysis_activity
+               WHERE user_id = ? AND id < ?
+               ORDER BY id DESC LIMIT ?""",
+            (user_id, before_id if before_id is not None else 2 ** 63 - 1, limit + 1)
+        ).fetchall()
+    finally:
+        conn.close()
+    return rows
+
+def format_activity(row):
+    return {
+        'title': row['title'],
+        'description': row['description'],
+        'time': row['created_at'],
+        'type': row['type']
+    }
+
+def read_data_file(user_id):
+    """Read the users legacy analytics.json as stored, None if they don't have one"""
+    data_file = os.path.join(DATA_DIR, str(user_id), 'analytics.json')
+    if not os.path.exists(data_file):
+        return None
+    
+    with open(data_file, 'r') as f:
+        return json.load(f)
+
+def load_data(user_id=None):
+    """Load the analytics counters for specific user"""
+    try:
+        return get_user_counters(user_id)
     except Exception as e:
         logging.error(f"Error loading data for user {user_id}: {str(e)}")
         # return empty default structure if theres an error
@@ -149,36 +510,9 @@ def load_data(user_id=None):
                 'Love': 0,
                 'neutral': 0
             },
-            'activities': [
-                {
-                    'title': 'Welcome to Sunsights',
-                    'description': 'Your sentiment analysis dashboard is ready',
-                    'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'type': 'info'
-                }
-            ],
             'isNewAccount': True
         }
 
-def save_data(data, user_id=None):
-    """Save analytics data to file for specific user"""
-    try:
-        # make sure user_id is a string
-        if user_id is not None:
-            user_id = str(user_id)
-        
-        # create user directory if it doesnt exist
-        user_dir = os.path.join(DATA_DIR, user_id)
-        os.makedirs(user_dir, exist_ok=True)
-        
-        # path to users analytics data file
-        data_file = os.path.join(user_dir, 'analytics.json')
-        
-        with open(data_file, 'w') as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        logging.error(f"Error saving analytics data for user {user_id}: {str(e)}")
-
 def generate_timestamps(days):
     end = datetime.now()
     start = end - timedelta(days=days)
@@ -202,19 +536,24 @@ def get_days_from_range(time_range):
 def test():
     return jsonify({'status': 'ok', 'message': 'Analytics API is working'})
 
-@analytics.route('/sentiment', methods=['GET'])
+@analytics.route('/inference-stats', methods=['GET'])
 @jwt_required()
-def get_sentiment():
-    current_user = get_jwt_identity()
-    user_id = get_user_id_from_email(current_user)
-    
-    # load the users data
-    user_data = load_data(user_id)
+def get_inference_stats():
+    """Report analysis cache counters, single text batching stats and model latency per token length"""
+    from app import analysis_cache, length_bucket_stats, single_text_batcher
     
+    return jsonify({
+        'cache': analysis_cache.stats(),
+        'batching': single_text_batcher.stats(),
+        'lengthBuckets': length_bucket_stats.stats()
+    })
+
+def build_sentiment(user_id, user_data, time_range):
+    """Sentiment trend chart payload"""
     # check if this is a new account with no analyses
     if user_data.get('isNewAccount', False) and user_data.get('totalAnalyses', 0) == 0:
         # return empty sentiment data for new accounts
-        return jsonify({
+        return {
             'labels': ['Day 1', 'Day 2', 'Day 3', 'Day 4', 'Day 5', 'Day 6', 'Day 7'],
             'datasets': [
                 {
@@ -232,35 +571,12 @@ def get_sentiment():
                     'tension': 0.4
                 }
             ]
-        })
-    
-    time_range = request.args.get('timeRange', '7d')
-    days = get_days_from_range(time_range)
-    timestamps = generate_timestamps(days)
-    
-    # Create realistic data based on the user's averageSentiment and totalAnalyses
-    avg_sentiment = user_data.get('averageSentiment', 75)
-    total_analyses = user_data.get('totalAnalyses', 0)
-    
-    # More stable data for users with more analyses
-    variation = max(5, 20 - min(total_analyses / 5, 15))
-    
-    # Generate positive data around the user's average sentiment
-    positive_data = []
-    for _ in timestamps:
-        if total_analyses > 0:
-            value = max(60, min(90, avg_sentiment + random.uniform(-variation, variation)))
-            positive_data.append(value)
-        else:
-            positive_data.append(random.randint(65, 85))
+        }
     
-    # Generate negative data as the complement to positive (with some noise)
-    negative_data = []
-    for pos in positive_data:
-        neg_value = max(5, min(40, 100 - pos + random.uniform(-5, 5)))
-        negative_data.append(neg_value)
+    # Read the real positive/negative trend from the stored rollups
+    timestamps, positive_data, negative_data = get_sentiment_series(user_id, time_range)
     
-    return jsonify({
+    return {
         'labels': timestamps,
         'datasets': [
             {
@@ -280,20 +596,13 @@ def get_sentiment():
                 'tension': 0.4,
             },
         ]
-    })
+    }
 
-@analytics.route('/emotions', methods=['GET'])
-@jwt_required()
-def get_emotions():
-    current_user = get_jwt_identity()
-    user_id = get_user_id_from_email(current_user)
-    
-    # Load the user's data
-    user_data = load_data(user_id)
-    
+def build_emotions(user_data):
+    """Emotion distribution chart payload"""
     # Check if this is a new account with no analyses
     if user_data.get('isNewAccount', False) and user_data.get('totalAnalyses', 0) == 0:
-        return jsonify({
+        return {
             'labels': ['Joy', 'Sadness', 'Anger', 'Fear', 'Surprise', 'Love', 'neutral'],
             'datasets': [{
                 'data': [0, 0, 0, 0, 0, 0, 0],
@@ -308,7 +617,7 @@ def get_emotions():
                 ],
                 'borderWidth': 0
             }]
-        })
+        }
     
     # Get emotion counts from user data
     emotions_count = user_data.get('emotionCounts', {
@@ -325,7 +634,7 @@ def get_emotions():
     emotion_labels = ['Joy', 'Sadness', 'Anger', 'Fear', 'Surprise', 'Love', 'neutral']
     emotion_data = [emotions_count.get(emotion, 0) for emotion in emotion_labels]
     
-    return jsonify({
+    return {
         'labels': emotion_labels,
         'datasets': [{
             'data': emotion_data,
@@ -340,20 +649,13 @@ def get_emotions():
             ],
             'borderWidth': 0
         }]
-    })
+    }
 
-@analytics.route('/priority', methods=['GET'])
-@jwt_required()
-def get_priority():
-    current_user = get_jwt_identity()
-    user_id = get_user_id_from_email(current_user)
-    
-    # Load the user's data to get real analytics
-    user_data = load_data(user_id)
-    
+def build_priority(user_id, user_data, time_range):
+    """Priority breakdown chart payload"""
     # Check if this is a new account with no analyses
     if user_data.get('isNewAccount', False) and user_data.get('totalAnalyses', 0) == 0:
-        return jsonify({
+        return {
             'labels': ['Last 7 Days'],
             'datasets': [
                 {
@@ -372,78 +674,13 @@ def get_priority():
                     'backgroundColor': '#34D399',
                 },
             ]
-        })
+        }
     
-    # Extract priorities from activities
-    activities = user_data.get('activities', [])
-    priorities_count = {'High': 0, 'Medium': 0, 'Low': 0}
-    
-    # Count priorities from activities
-    for activity in activities:
-        description = activity.get('description', '').lower()
-        if 'priority: high' in description:
-            priorities_count['High'] += 1
-        elif 'priority: medium' in description:
-            priorities_count['Medium'] += 1
-        elif 'priority: low' in description:
-            priorities_count['Low'] += 1
-    
-    # Check if we found any priorities
-    total_prioritized = sum(priorities_count.values())
-    
-    # If no priorities found in activities or if they don't match total analyses,
-    # distribute based on sentiment scores from activities
-    if total_prioritized == 0 or total_prioritized != user_data.get('totalAnalyses', 0):
-        # Reset counts if we're going to recalculate
-        priorities_count = {'High': 0, 'Medium': 0, 'Low': 0}
-        
-        # Go through all activities and extract sentiment and priority information
-        for activity in activities:
-            description = activity.get('description', '').lower()
-            
-            # First try to extract explicit priority
-            priority_match = re.search(r'priority: (high|medium|low)', description, re.IGNORECASE)
-            if priority_match:
-                priority = priority_match.group(1).capitalize()
-                priorities_count[priority] += 1
-                continue  # Skip to next activity if we found a priority
-                
-            # If no explicit priority, try to extract sentiment
-            sentiment_match = re.search(r'sentiment: (positive|negative|neutral|mixed)', description, re.IGNORECASE)
-            if sentiment_match:
-                sentiment = sentiment_match.group(1).lower()
-                
-                # Assign priority based on sentiment
-                if sentiment == 'negative':
-                    priorities_count['High'] += 1
-                elif sentiment == 'mixed' or sentiment == 'neutral':
-                    priorities_count['Medium'] += 1
-                elif sentiment == 'positive':
-                    priorities_count['Low'] += 1
-                else:
-                    # Default to medium if sentiment is unclear
-                    priorities_count['Medium'] += 1
-            else:
-                # If no sentiment info, default to medium
-                priorities_count['Medium'] += 1
-    
-    # If priorities don't add up to total analyses, adjust to match
-    if sum(priorities_count.values()) != user_data.get('totalAnalyses', 0):
-        # Find the most important priority based on sentiment
-        avg_sentiment = user_data.get('averageSentiment', 75)
-        if avg_sentiment > 80:
-            priority_to_adjust = 'Low'
-        elif avg_sentiment > 60:
-            priority_to_adjust = 'Medium'
-        else:
-            priority_to_adjust = 'High'
-            
-        # Adjust the priority count to make total match
-        priorities_count[priority_to_adjust] = max(0, user_data.get('totalAnalyses', 0) - 
-            sum(v for k, v in priorities_count.items() if k != priority_to_adjust))
+    # Read the structured priority counters, all time or for the requested range
+    priorities_count = get_priority_counts(user_id, time_range)
     
-    return jsonify({
-        'labels': ['Last 7 Days'],
+    return {
+        'labels': [get_range_label(time_range)],
         'datasets': [
             {
                 'label': 'High Priority',
@@ -461,58 +698,137 @@ def get_priority():
                 'backgroundColor': '#34D399',
             },
         ]
-    })
-
-@analytics.route('/activity', methods=['GET'])
-@jwt_required()
-def get_activity():
-    current_user = get_jwt_identity()
-    user_id = get_user_id_from_email(current_user)
-    
-    data = load_data(user_id)
-    return jsonify(data.get('activities', []))
+    }
 
-@analytics.route('/summary', methods=['GET'])
-@jwt_required()
-def get_summary():
-    current_user = get_jwt_identity()
-    user_id = get_user_id_from_email(current_user)
-    
-    # Load the user's data
-    user_data = load_data(user_id)
-    
+def build_activity(user_id):
+    """Recent activity list payload, the first page of /activity"""
+    rows = get_activities(user_id, ACTIVITY_PAGE_SIZE)
+    return [format_activity(row) for row in rows[:ACTIVITY_PAGE_SIZE]]
 
-    
+def build_summary(user_data):
+    """Summary card payload"""
     # Check if this is a new account with no analyses
     if user_data.get('isNewAccount', False) and user_data.get('totalAnalyses', 0) == 0:
-        return jsonify({
+        return {
             'totalAnalyses': 0,
             'averageSentiment': 0,
             'responseRate': 0,
             'responseTime': 0,
             'lastAnalysisTime': None
-        })
+        }
     
     # Get the average sentiment value
     avg_sentiment = user_data.get('averageSentiment', 75)
     
     # Otherwise, return the actual data INCLUDING lastAnalysisTime
-    result = {
+    return {
         'totalAnalyses': user_data.get('totalAnalyses', 0),
         'averageSentiment': avg_sentiment,
         'responseRate': 92,  # Placeholder - would be calculated from real data
         'responseTime': 2.5,  # Placeholder - would be calculated from real data
         'lastAnalysisTime': user_data.get('lastAnalysisTime')
     }
+
+@analytics.route('/sentiment', methods=['GET'])
+@jwt_required()
+def get_sentiment():
+    user_id = current_user_id()
     
-    return jsonify(result)
+    # load the users data
+    user_data = load_data(user_id)
+    return jsonify(build_sentiment(user_id, user_data, request.args.get('timeRange', '7d')))
+
+@analytics.route('/emotions', methods=['GET'])
+@jwt_required()
+def get_emotions():
+    user_id = current_user_id()
+    
+    # Load the user's data
+    user_data = load_data(user_id)
+    return jsonify(build_emotions(user_data))
+
+@analytics.route('/priority', methods=['GET'])
+@jwt_required()
+def get_priority():
+    user_id = current_user_id()
+    
+    # Load the user's data to get real analytics
+    user_data = load_data(user_id)
+    return jsonify(build_priority(user_id, user_data, request.args.get('timeRange')))
+
+@analytics.route('/activity', methods=['GET'])
+@jwt_required()
+def get_activity():
+    user_id = current_user_id()
+    
+    try:
+        limit, after = get_page_args(ACTIVITY_PAGE_SIZE, ACTIVITY_MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # newest first, the cursor is the id of the last activity on the previous page
+    rows = get_activities(user_id, limit, after[0] if after else None)
+    
+    # the cursor for the next page goes in a header so the body stays a plain list
+    return paginated_response(
+        jsonify([format_activity(row) for row in rows[:limit]]), rows, limit,
+        lambda row: (row['id'],)
+    )
+
+@analytics.route('/summary', methods=['GET'])
+@jwt_required()
+def get_summary():
+    user_id = current_user_id()
+    
+    # Load the user's data
+    user_data = load_data(user_id)
+    return jsonify(build_summary(user_data))
+
+@analytics.route('/dashboard', methods=['GET'])
+@jwt_required()
+def get_dashboard():
+    """
+    Return the summary, sentiment, emotions, priority and activity payloads together.
+    
+    The user is looked up and their data loaded once for all five. The ETag
+    changes whenever the users analytics change, so an unchanged dashboard
+    is answered with a 304 before anything is loaded.
+    """
+    from flask import make_response
+    
+    user_id = current_user_id()
+    time_range = request.args.get('timeRange', '7d')
+    
+    # the hour is part of the tag because the sentiment and priority windows move with the clock,
+    # the user because revisions are counted per user and two users can be on the same one
+    etag = hashlib.sha1(
+        f"{user_id}|{get_revision(user_id)}|{time_range}|{datetime.now().strftime('%Y-%m-%d %H')}".encode()
+    ).hexdigest()
+    
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        user_data = load_data(user_id)
+        response = jsonify({
+            'summary': build_summary(user_data),
+            'sentiment': build_sentiment(user_id, user_data, time_range),
+            'emotions': build_emotions(user_data),
+            'priority': build_priority(user_id, user_data, time_range),
+            'activity': build_activity(user_id)
+        })
+    
+    response.set_etag(etag)
+    # let the browser keep the dashboard but check with us before reusing it
+    response.headers['Cache-Control'] = 'private, no-cache'
+    # the same url answers differently for each signed in user
+    response.vary.add('Authorization')
+    return response
 
 @analytics.route('/analyze', methods=['POST'])
 @jwt_required()
 def analyze_single():
     try:
-        current_user = get_jwt_identity()
-        user_id = get_user_id_from_email(current_user)
+        user_id = current_user_id()
         
         data = request.get_json()
         if not data or 'text' not in data:
@@ -532,62 +848,17 @@ def analyze_single():
         if result is None:
             return jsonify({'error': 'Could not analyze text. Text may be invalid.'}), 400
             
-        # Update analytics data
-        analytics_data = load_data(user_id)
-        analytics_data['totalAnalyses'] += 1
-        analytics_data['lastAnalysisTime'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Set isNewAccount to False when user submits their first comment
-        analytics_data['isNewAccount'] = False
+        # Store the result and update the users counters
+        record_analyses(user_id, [result], 'single')
         
         # Add to activities
-        analytics_data['activities'].insert(0, {
+        add_activity(user_id, {
             'title': 'Text Analysis Completed',
             'description': f'Sentiment: {result["sentiment"]}, Emotion: {result["emotion"]}, Priority: {result["priority"]}',
             'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'type': 'success'
         })
         
-        # Track emotion counts
-        emotion = result.get('emotion', '')
-        if emotion:
-            # Normalize emotion name to match our categories
-            emotion_key = emotion.capitalize()
-            if emotion_key not in analytics_data.get('emotionCounts', {}):
-                # If it's not one of our standard emotions, default to neutral
-                emotion_key = 'neutral'
-            
-            # Initialize emotionCounts if it doesn't exist
-            if 'emotionCounts' not in analytics_data:
-                analytics_data['emotionCounts'] = {
-                    'Joy': 0,
-                    'Sadness': 0,
-                    'Anger': 0,
-                    'Fear': 0,
-                    'Surprise': 0,
-                    'Love': 0,
-                    'neutral': 0
-                }
-            
-            # Increment the emotion count
-            analytics_data['emotionCounts'][emotion_key] = analytics_data['emotionCounts'].get(emotion_key, 0) + 1
-        
-        # Calculate average sentiment
-        sentiment_score = result['sentiment_score']  # Already a percentage (0-100)
-        old_avg = analytics_data.get('averageSentiment', 75)
-        total_analyses = analytics_data.get('totalAnalyses', 1)
-        
-        # Weighted average with more weight to current score for newer accounts
-        if total_analyses <= 5:
-            # For new accounts, give more weight to recent analyses
-            analytics_data['averageSentiment'] = (old_avg * 0.7) + (sentiment_score * 0.3)
-        else:
-            # For established accounts, use regular average
-            analytics_data['averageSentiment'] = (old_avg * (total_analyses - 1) + sentiment_score) / total_analyses
-        
-        # Save updated data
-        save_data(analytics_data, user_id)
-        
         # Generate response suggestions
         response_suggestions = []
         if result['sentiment'] == 'Positive':
@@ -618,319 +889,389 @@ def analyze_single():
         logging.error(f"Error analyzing text: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@analytics.route('/analyze-bulk', methods=['POST'])
-@jwt_required()
-def analyze_bulk():
-    try:
-        current_user = get_jwt_identity()
-        user_id = get_user_id_from_email(current_user)
-        
-        # check if file is in request
-        if 'file' not in request.files:
-            return jsonify({'error': 'No file provided'}), 400
-        
-        # get all files with 'file' key to handle multiple file uploads
-        files_list = request.files.getlist('file')
+def get_bulk_files():
+    """Get the uploaded bulk files from the request, returns (files, error_response)"""
+    # check if file is in request
+    if 'file' not in request.files:
+        return None, (jsonify({'error': 'No file provided'}), 400)
+    
+    # get all files with 'file' key to handle multiple file uploads
+    files_list = request.files.getlist('file')
+    
+    # Check if any files are empty
+    valid_files = []
+    for file in files_list:
+        if file.filename != '':
+            valid_files.append(file)
+    
+    if len(valid_files) == 0:
+        return None, (jsonify({'error': 'No valid files provided'}), 400)
         
-        # Check if any files are empty
-        valid_files = []
-        for file in files_list:
-            if file.filename != '':
-                valid_files.append(file)
+    # enhanced file validation
+    allowed_extensions = {'csv', 'xlsx', 'xls'}
+    
+    for file in valid_files:
+        file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
+        file_size_mb = file.content_length / (1024 * 1024) if file.content_length else 0
         
-        if len(valid_files) == 0:
-            return jsonify({'error': 'No valid files provided'}), 400
-            
-        # enhanced file validation
-        allowed_extensions = {'csv', 'xlsx', 'xls'}
+        # Validate file extension
+        if file_ext not in allowed_extensions:
+            return None, (jsonify({
+                'error': f'Invalid file type for {file.filename}. Allowed types: {", ".join(allowed_extensions)}. Please use CSV (.csv) or Excel (.xlsx, .xls) files only.'
+            }), 400)
         
-        for file in valid_files:
-            file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
-            file_size_mb = file.content_length / (1024 * 1024) if file.content_length else 0
-            
+        # Validate file size (10MB limit)
+        if file_size_mb > 10:
+            return None, (jsonify({
+                'error': f'File {file.filename} is too large ({file_size_mb:.1f} MB). Maximum file size is 10 MB.'
+            }), 400)
+    
+    return valid_files, None
 
-            
-            # Validate file extension
-            if file_ext not in allowed_extensions:
-                return jsonify({
-                    'error': f'Invalid file type for {file.filename}. Allowed types: {", ".join(allowed_extensions)}. Please use CSV (.csv) or Excel (.xlsx, .xls) files only.'
-                }), 400
-            
-            # Validate file size (10MB limit)
-            if file_size_mb > 10:
-                return jsonify({
-                    'error': f'File {file.filename} is too large ({file_size_mb:.1f} MB). Maximum file size is 10 MB.'
-                }), 400
-                
-            
-            
-        # Process all files and combine results
-        try:
-            import pandas as pd
-            import io
-            import time
-            
-            # Performance timing
-            start_time = time.time()
+def get_comment_column():
+    """The comment column the client chose with the column parameter, None to pick one per file"""
+    column = (request.form.get('column') or request.args.get('column') or '').strip()
+    return column or None
 
-            
-            # Initialize combined results
-            all_results = []
-            combined_sentiment_counts = {'Positive': 0, 'Negative': 0, 'Mixed': 0}
-            combined_priority_counts = {'High': 0, 'Medium': 0, 'Low': 0}
-            combined_total_sentiment = 0
-            combined_valid_count = 0
-            
-            # Process each file
-            for file_index, file in enumerate(valid_files):
-                
-                # Determine file extension
-                file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
-                
-                # Save the file to a temporary location
-                file_stream = io.BytesIO(file.read())
-                
-                # Read the file with pandas based on its extension
-                if file_ext == 'csv':
-                    df = pd.read_csv(file_stream)
-                else:  # xlsx or xls
-                    df = pd.read_excel(file_stream)
-                    
-                # Check if the dataframe has any data
-                if df.empty:
-                    continue
-                
-                # Enhanced column detection with detailed logging
-                comment_col = None
-                possible_cols = ['comment', 'comments', 'text', 'feedback', 'review', 'message', 'content']
-                
+def record_bulk_analytics(user_id, analyzed_count, file_count, average_sentiment):
+    """Count a finished bulk analysis and add its activity, the results are recorded per chunk"""
+    record_analyses(user_id, [], 'bulk', bulk_uploads=1)
+    
+    # Add a single bulk analysis activity instead of one per comment
+    add_activity(user_id, {
+        'title': "Bulk analysis completed",
+        'description': f"Analyzed {analyzed_count} comments from {file_count} files. Avg sentiment: {average_sentiment:.1f}%",
+        'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'type': 'analysis'
+    })
 
-                
-                # First try: exact match with preferred column names
-                for col in possible_cols:
-                    if col.lower() in [c.lower() for c in df.columns]:
-                        # Find the actual column name (case-insensitive match)
-                        for actual_col in df.columns:
-                            if actual_col.lower() == col.lower():
-                                comment_col = actual_col
-                                break
-                        if comment_col:
-                            break
-                        
-                # Second try: use the first text column if no preferred name found
-                if comment_col is None:
-                    for col in df.columns:
-                        if df[col].dtype == 'object':  # String/object type
-                            comment_col = col
-                            break
-                            
-                # Final check: if still no column found, skip this file
-                if comment_col is None:
-                    continue
-                
-                # Process each comment in this file
-                file_start_time = time.time()
-                file_results = []
-                file_valid_count = 0
-                
-                # CSV PROCESSING DEBUG LOGS
-                total_rows = len(df)
-                total_rows_with_data = len(df[comment_col].dropna())
+def new_bulk_counts():
+    return {
+        'sentimentDistribution': {'Positive': 0, 'Negative': 0, 'Mixed': 0},
+        'priorityDistribution': {'High': 0, 'Medium': 0, 'Low': 0},
+        'totalSentiment': 0,
+        'totalAnalyzed': 0
+    }
 
-                
-                # Count what we can convert to valid text
-                convertible_count = 0
-                truly_empty_count = 0
-                
-                for idx, comment in df[comment_col].items():
-                    if pd.isna(comment) or comment is None:
-                        comment_str = ""
-                    else:
-                        comment_str = str(comment).strip()
-                    
-                    if comment_str and len(comment_str) >= 2:
-                        convertible_count += 1
-                    else:
-                        truly_empty_count += 1
-                            
+def add_bulk_result(counts, sentiment, priority, sentiment_score):
+    counts['sentimentDistribution'][sentiment] = counts['sentimentDistribution'].get(sentiment, 0) + 1
+    counts['priorityDistribution'][priority] = counts['priorityDistribution'].get(priority, 0) + 1
+    counts['totalSentiment'] += sentiment_score  # Already a percentage (0-100)
+    counts['totalAnalyzed'] += 1
 
-                
-                # Process each comment (including ALL rows, even with NaN)
-                processed_count = 0
-                skipped_count = 0
-                
-                # Use ALL rows, not just dropna() - handle NaN/null values as empty strings
-                for idx, comment in df[comment_col].items():
-                    # Convert any value to string and clean it
-                    if pd.isna(comment) or comment is None:
-                        comment_str = ""
-                    else:
-                        comment_str = str(comment).strip()
-                    
-                    # Only skip if truly empty after conversion (minimum 2 characters for meaningful analysis)
-                    if comment_str and len(comment_str) >= 2:
-                        processed_count += 1
-                        try:
-                            # Import analyze_text function if not already imported
-                            try:
-                                from app import analyze_text
-                            except ImportError:
-                                logging.error("Failed to import analyze_text function")
-                                return jsonify({'error': 'Internal server error: analyze_text function not available'}), 500
-                                
-                            result = analyze_text(comment_str)
-                            
-                            # Normalize sentiment to title case to ensure consistency
-                            normalized_sentiment = result['sentiment'].title()
-                            
-                            # Add to file results
-                            file_result = {
-                                'text': comment_str[:100] + '...' if len(comment_str) > 100 else comment_str,
-                                'sentiment': normalized_sentiment,
-                                'sentiment_score': result['sentiment_score'],
-                                'emotion': result['emotion'],
-                                'priority': result['priority'],
-                                'source_file': file.filename
-                            }
-                            file_results.append(file_result)
-                            all_results.append(file_result)
-                            
-                            # Update combined counts using normalized sentiment
-                            combined_sentiment_counts[normalized_sentiment] = combined_sentiment_counts.get(normalized_sentiment, 0) + 1
-                            combined_priority_counts[result['priority']] = combined_priority_counts.get(result['priority'], 0) + 1
-                            
-                            # Update combined total sentiment
-                            combined_total_sentiment += result['sentiment_score']  # Already a percentage (0-100)
-                            combined_valid_count += 1
-                            file_valid_count += 1
-                        except Exception as e:
-                            logging.error(f"Error analyzing comment from {file.filename}: {str(e)}")
-                            skipped_count += 1
-                    else:
-                        skipped_count += 1
-        
-                
-                file_end_time = time.time()
-                file_duration = file_end_time - file_start_time
-                
-                # FINAL CSV PROCESSING SUMMARY
+def bulk_counts_summary(counts):
+    return {
+        'sentimentDistribution': dict(counts['sentimentDistribution']),
+        'priorityDistribution': dict(counts['priorityDistribution']),
+        'averageSentiment': counts['totalSentiment'] / counts['totalAnalyzed'] if counts['totalAnalyzed'] > 0 else 50
+    }
 
+def iter_bulk_analysis(files, user_id, job=None, column=None):
+    """
+    Analyze the comments in every uploaded file, yielding results chunk by chunk.
+    
+    Files are parsed at the same time by a pool of BULK_PARSE_WORKERS threads,
+    which keep reading ahead while the models run. Their chunks all go through
+    this one loop, so rows from every file share the same model batches.
+    Chunks of one file arrive in order, chunks of different files interleave.
+    
+    Only running counters are kept between chunks, so memory does not grow
+    with the number of rows. Each chunk's results are stored as analysis
+    events as soon as they are produced.
+    
+    Comments that only differ in case or surrounding whitespace are analyzed
+    once per upload, across all of its files, and the result is reused for
+    every row. The summary reports how many rows that saved and roughly how
+    much time.
+    
+    Args:
+        files (list): (filename, binary stream) pairs
+        user_id (str): The user running the analysis
+        job (Job): Optional background job to report rows read to and check for cancellation,
+            the caller sets its total
+        column (str): Comment column chosen by the client, picked per file when not set
+        
+    Yields:
+        dict: A {'type': 'results'} event per analyzed chunk with its results and
+        the running summary, then a final {'type': 'complete'} event with per file summaries
+    """
+    from app import analyze_texts, app
+    
+    # Rows read and analyzed at a time, progress and cancellation are checked between chunks
+    chunk_rows = app.config['BULK_CHUNK_ROWS']
+    
+    # Results of the texts analyzed so far in this upload, by dedup key
+    upload_results = {}
+    max_dedup_texts = app.config['BULK_DEDUP_MAX_TEXTS']
+    total_comments = 0
+    unique_comments = 0
+    analysis_seconds = 0
+    
+    # Counters for the whole upload and for each file
+    combined_counts = new_bulk_counts()
+    file_counts = [new_bulk_counts() for _ in files]
+    
+    def summary():
+        return {
+            **bulk_counts_summary(combined_counts),
+            'dedup': {
+                'totalComments': total_comments,
+                'uniqueComments': unique_comments,
+                'dedupRatio': round(1 - unique_comments / total_comments, 4) if total_comments else 0,
+                # duplicates times the average analysis time of a unique comment
+                'timeSavedSeconds': round(
+                    analysis_seconds / unique_comments * (total_comments - unique_comments), 3
+                ) if unique_comments else 0
+            }
+        }
+    
+    # Stored results of the whole upload, dropped if the analysis does not finish
+    results_writer = UploadResultsWriter(
+        app.config['BULK_RESULTS_DIR'], user_id, [filename for filename, _ in files],
+        app.config['BULK_RESULTS_FORMAT'], app.config['BULK_RESULTS_MAX_UPLOADS']
+    )
+    try:
+        for file_index, chunk, comment_col, chunk_comments, positions in iter_upload_comments(files, chunk_rows, app.config['BULK_PARSE_WORKERS'], column):
+            filename = files[file_index][0]
             
-            # Get analytics data once to update bulk uploads count
-            analytics_data = load_data(user_id)
-            analytics_data['bulkUploads'] = analytics_data.get('bulkUploads', 0) + 1
-            analytics_data['isNewAccount'] = False
-            save_data(analytics_data, user_id)
-            
-            # Calculate combined average sentiment
-            combined_average_sentiment = combined_total_sentiment / combined_valid_count if combined_valid_count > 0 else 50
-            
-            # optimized: batch update analytics data instead of saving after each comment
-            
-            # Load analytics data once
-            analytics_data = load_data(user_id)
-            
-            # Batch update total analyses count
-            analytics_data['totalAnalyses'] += combined_valid_count
-            
-            # Batch update emotion counts
-            emotion_batch_counts = {}
-            for result in all_results:
-                emotion = result.get('emotion', '')
-                if emotion:
-                    # Normalize emotion name to match our categories
-                    emotion_key = emotion.capitalize()
-                    if emotion_key not in analytics_data.get('emotionCounts', {}):
-                        emotion_key = 'neutral'
-                    emotion_batch_counts[emotion_key] = emotion_batch_counts.get(emotion_key, 0) + 1
-            
-            # Initialize emotionCounts if it doesn't exist
-            if 'emotionCounts' not in analytics_data:
-                analytics_data['emotionCounts'] = {
-                    'Joy': 0, 'Sadness': 0, 'Anger': 0, 'Fear': 0, 'Surprise': 0, 'Love': 0, 'neutral': 0
-                }
+            if job:
+                job.check_cancelled()
             
-            # Apply batch emotion updates
-            for emotion_key, count in emotion_batch_counts.items():
-                analytics_data['emotionCounts'][emotion_key] = analytics_data['emotionCounts'].get(emotion_key, 0) + count
+            # Only analyze comments not seen earlier in the upload
+            chunk_keys = [dedup_key(comment_str) for comment_str in chunk_comments]
+            new_texts = {}
+            for comment_str, key in zip(chunk_comments, chunk_keys):
+                if key not in upload_results and key not in new_texts:
+                    new_texts[key] = comment_str
             
-            # Add a single bulk analysis activity instead of one per comment
-            analytics_data['activities'].insert(0, {
-                'title': f"Bulk analysis completed",
-                'description': f"Analyzed {combined_valid_count} comments from {len(valid_files)} files. Avg sentiment: {combined_average_sentiment:.1f}%",
-                'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'type': 'analysis'
-            })
+            # Run both models over the new comments in micro-batches instead of one row at a time
+            start = time.perf_counter()
+            chunk_lookup = dict(zip(new_texts, analyze_texts(list(new_texts.values()))))
+            analysis_seconds += time.perf_counter() - start
+            total_comments += len(chunk_comments)
+            unique_comments += len(new_texts)
             
-            # Keep activities list manageable
-            if len(analytics_data['activities']) > 100:
-                analytics_data['activities'] = analytics_data['activities'][:100]
+            for key, result in chunk_lookup.items():
+                if len(upload_results) >= max_dedup_texts:
+                    break
+                upload_results[key] = result
             
-            # Save the updated data ONCE at the end
-            analytics_start_time = time.time()
-
-            save_data(analytics_data, user_id)
-            analytics_end_time = time.time()
+            chunk_results = []
+            annotations = []
+            for comment_str, key in zip(chunk_comments, chunk_keys):
+                result = chunk_lookup[key] if key in chunk_lookup else upload_results[key]
+                annotation = None
+                try:
+                    # Normalize sentiment to title case to ensure consistency
+                    normalized_sentiment = result['sentiment'].title()
+                    
+                    priority = normalize_priority(result['priority'])
+                    
+                    chunk_results.append({
+                        'text': comment_str[:100] + '...' if len(comment_str) > 100 else comment_str,
+                        'sentiment': normalized_sentiment,
+                        'sentiment_score': result['sentiment_score'],
+                        'emotion': result['emotion'],
+                        'priority': priority,
+                        'source_file': filename
+                    })
+                    
+                    add_bulk_result(combined_counts, normalized_sentiment, priority, result['sentiment_score'])
+                    add_bulk_result(file_counts[file_index], normalized_sentiment, priority, result['sentiment_score'])
+                    annotation = {
+                        'sentiment': normalized_sentiment,
+                        'sentiment_score': result['sentiment_score'],
+                        'emotion': result['emotion'],
+                        'priority': priority
+                    }
+                except Exception as e:
+                    logging.error(f"Error analyzing comment from {filename}: {str(e)}")
+                annotations.append(annotation)
             
-            # Final performance summary
-            total_duration = time.time() - start_time
-            analytics_duration = analytics_end_time - analytics_start_time
-
+            # Keep every row of the file with its analysis for /uploads/<id>/export
+            results_writer.write(file_index, chunk, comment_col, positions, annotations)
             
-            # Return all combined results to the frontend
-            response = {
-                'totalAnalyzed': combined_valid_count,
-                'results': all_results,
-                'summary': {
-                    'sentimentDistribution': combined_sentiment_counts,
-                    'priorityDistribution': combined_priority_counts,
-                    'averageSentiment': combined_average_sentiment
-                },
-                'filesProcessed': len(valid_files),
-                'fileNames': [f.filename for f in valid_files]
-            }
+            if job:
+                job.advance(len(chunk))
             
-            # If no valid comments were found, add mock data to prevent empty analysis
-            if combined_valid_count == 0:
-                mock_results = [
-                    {
-                        'text': "This product exceeded my expectations!",
-                        'sentiment': "Positive",
-                        'emotion': "joy",
-                        'priority': "Low",
-                        'sentiment_score': 0.9
-                    },
-                    {
-                        'text': "I've been waiting for a refund for 2 weeks now.",
-                        'sentiment': "Negative",
-                        'emotion': "anger",
-                        'priority': "High",
-                        'sentiment_score': 0.2
-                    },
-                    {
-                        'text': "The service was okay, but could be improved.",
-                        'sentiment': "Neutral",
-                        'emotion': "neutral",
-                        'priority': "Medium",
-                        'sentiment_score': 0.5
-                    }
-                ]
+            if chunk_results:
+                # Store each chunk as it is done so nothing accumulates across chunks
+                record_analyses(user_id, chunk_results, 'bulk')
                 
-                response = {
-                    'totalAnalyzed': 3,
-                    'results': mock_results,
-                    'summary': {
-                        'sentimentDistribution': {'Positive': 1, 'Negative': 1, 'Neutral': 1},
-                        'priorityDistribution': {'High': 1, 'Medium': 1, 'Low': 1},
-                        'averageSentiment': 50
-                    }
+                yield {
+                    'type': 'results',
+                    'sourceFile': filename,
+                    'fileIndex': file_index,
+                    'results': chunk_results,
+                    'totalAnalyzed': combined_counts['totalAnalyzed'],
+                    'summary': summary()
                 }
-                
-                # Log warning about using mock data
-                logging.warning("No valid comments found in file, using mock data")
             
+        results_writer.finish()
+    except BaseException:
+        results_writer.abort()
+        raise
+    
+    final_summary = summary()
+    
+    record_bulk_analytics(user_id, combined_counts['totalAnalyzed'], len(files), final_summary['averageSentiment'])
+    
+    yield {
+        'type': 'complete',
+        'uploadId': results_writer.upload_id,
+        'totalAnalyzed': combined_counts['totalAnalyzed'],
+        'summary': final_summary,
+        'fileSummaries': [
+            {'fileName': filename, 'totalAnalyzed': counts['totalAnalyzed'], **bulk_counts_summary(counts)}
+            for (filename, _), counts in zip(files, file_counts)
+        ],
+        'filesProcessed': len(files),
+        'fileNames': [filename for filename, _ in files]
+    }
+
+def run_bulk_analysis(files, user_id, column=None):
+    """
+    Analyze the comments in every uploaded file and update the users analytics.
+    
+    Args:
+        files (list): (filename, binary stream) pairs
+        user_id (str): The user running the analysis
+        column (str): Comment column chosen by the client, picked per file when not set
+        
+    Returns:
+        dict: The bulk analysis response
+    """
+    # Files are analyzed at the same time, put the rows back in upload order
+    file_results = [[] for _ in files]
+    for event in iter_bulk_analysis(files, user_id, column=column):
+        if event['type'] == 'results':
+            file_results[event['fileIndex']].extend(event['results'])
+        else:
+            complete = event
+    all_results = [result for results in file_results for result in results]
+    
+    # Return all combined results to the frontend
+    response = {
+        'totalAnalyzed': complete['totalAnalyzed'],
+        'results': all_results,
+        'summary': complete['summary'],
+        'uploadId': complete['uploadId'],
+        'fileSummaries': complete['fileSummaries'],
+        'filesProcessed': complete['filesProcessed'],
+        'fileNames': complete['fileNames']
+    }
+    
+    # If no valid comments were found, add mock data to prevent empty analysis
+    if complete['totalAnalyzed'] == 0:
+        mock_results = [
+            {
+                'text': "This product exceeded my expectations!",
+                'sentiment': "Positive",
+                'emotion': "joy",
+                'priority': "Low",
+                'sentiment_score': 0.9
+            },
+            {
+                'text': "I've been waiting for a refund for 2 weeks now.",
+                'sentiment': "Negative",
+                'emotion': "anger",
+                'priority': "High",
+                'sentiment_score': 0.2
+            },
+            {
+                'text': "The service was okay, but could be improved.",
+                'sentiment': "Neutral",
+                'emotion': "neutral",
+                'priority': "Medium",
+                'sentiment_score': 0.5
+            }
+        ]
+        
+        response = {
+            'totalAnalyzed': 3,
+            'results': mock_results,
+            'summary': {
+                'sentimentDistribution': {'Positive': 1, 'Negative': 1, 'Neutral': 1},
+                'priorityDistribution': {'High': 1, 'Medium': 1, 'Low': 1},
+                'averageSentiment': 50
+            }
+        }
+        
+        # Log warning about using mock data
+        logging.warning("No valid comments found in file, using mock data")
+    
+    return response
+
+def get_stream_format():
+    """Pick the streaming format for /analyze-bulk from ?stream= or the Accept header, None for plain JSON"""
+    stream_format = request.args.get('stream', '').lower()
+    if stream_format in ('ndjson', 'sse'):
+        return stream_format
+    
+    accept = request.headers.get('Accept', '')
+    if 'application/x-ndjson' in accept:
+        return 'ndjson'
+    if 'text/event-stream' in accept:
+        return 'sse'
+    return None
+
+def stream_bulk_analysis(files, user_id, stream_format, column=None):
+    """
+    Stream bulk analysis events as they are produced.
+    
+    NDJSON sends one JSON event per line. SSE sends each event as a
+    'results', 'complete' or 'error' server-sent event.
+    """
+    from flask import Response, stream_with_context
+    
+    def encode(event):
+        if stream_format == 'sse':
+            return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        return json.dumps(event) + '\n'
+    
+    def generate():
+        try:
+            for event in iter_bulk_analysis(files, user_id, column=column):
+                yield encode(event)
+        except Exception as e:
+            # headers are already sent, so report the failure in the stream
+            logging.error(f"Error streaming bulk analysis: {str(e)}")
+            yield encode({'type': 'error', 'error': f'Error processing file: {str(e)}'})
+    
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        # stop proxies from buffering the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@analytics.route('/analyze-bulk', methods=['POST'])
+@jwt_required()
+def analyze_bulk():
+    try:
+        user_id = current_user_id()
+        
+        valid_files, error_response = get_bulk_files()
+        if error_response:
+            return error_response
+        
+        files = [(file.filename, file.stream) for file in valid_files]
+        column = get_comment_column()
+        
+        # Stream results batch by batch when asked to
+        stream_format = get_stream_format()
+        if stream_format:
+            return stream_bulk_analysis(files, user_id, stream_format, column)
+        
+        # Process all files and combine results
+        try:
+            response = run_bulk_analysis(files, user_id, column=column)
             return jsonify(response)
             
+        except ColumnNotFoundError as e:
+            return jsonify({'error': str(e)}), 400
+            
         except Exception as e:
             logging.error(f"Error processing file: {str(e)}")
             return jsonify({'error': f'Error processing file: {str(e)}'}), 500
@@ -938,3 +1279,186 @@ def analyze_bulk():
     except Exception as e:
         logging.error(f"Error analyzing bulk file: {str(e)}")
         return jsonify({'error': f'Error analyzing bulk file: {str(e)}'}), 500
+
+def _run_bulk_job(job, paths, column=None):
+    """
+    Background job body for /analyze/process.
+    
+    Only the summary is kept as the job result. The analyzed rows are in the
+    upload's stored results, where /jobs/<id>/results pages them from.
+    """
+    files = []
+    try:
+        for filename, path in paths:
+            files.append((filename, open(path, 'rb')))
+        
+        # count the rows before analyzing so progress has a fixed total, left unknown if a file can't be counted
+        row_counts = [count_rows(filename, stream) for filename, stream in files]
+        if None not in row_counts:
+            job.add_total(sum(row_counts))
+        
+        for event in iter_bulk_analysis(files, job.user_id, job, column):
+            if event['type'] == 'complete':
+                complete = event
+        return {
+            'totalAnalyzed': complete['totalAnalyzed'],
+            'summary': complete['summary'],
+            'uploadId': complete['uploadId'],
+            'fileSummaries': complete['fileSummaries'],
+            'filesProcessed': complete['filesProcessed'],
+            'fileNames': complete['fileNames']
+        }
+    finally:
+        for _, stream in files:
+            stream.close()
+
+@analytics.route('/analyze/process', methods=['POST'])
+@jwt_required()
+def start_bulk_job():
+    """Queue a bulk analysis and return its job id straight away"""
+    try:
+        import shutil
+        import tempfile
+        from werkzeug.utils import secure_filename
+        from app import bulk_jobs
+        
+        user_id = current_user_id()
+        
+        valid_files, error_response = get_bulk_files()
+        if error_response:
+            return error_response
+        
+        # the upload stream closes with the request, so keep the files on disk for the worker
+        job_dir = tempfile.mkdtemp(prefix='sunsights_job_')
+        paths = []
+        for index, file in enumerate(valid_files):
+            path = os.path.join(job_dir, f"{index}_{secure_filename(file.filename)}")
+            file.save(path)
+            paths.append((file.filename, path))
+        
+        job = bulk_jobs.submit(
+            user_id, _run_bulk_job, paths, get_comment_column(),
+            description=f"Bulk analysis of {len(paths)} files",
+            cleanup=lambda: shutil.rmtree(job_dir, ignore_errors=True)
+        )
+        
+        return jsonify(job.progress()), 202
+        
+    except Exception as e:
+        logging.error(f"Error starting bulk job: {str(e)}")
+        return jsonify({'error': f'Error starting bulk job: {str(e)}'}), 500
+
+@analytics.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_bulk_job(job_id):
+    """Report progress of a bulk analysis job"""
+    from app import bulk_jobs
+    
+    user_id = current_user_id()
+    job = bulk_jobs.get(job_id, user_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(job.progress())
+
+@analytics.route('/jobs/<job_id>/results', methods=['GET'])
+@jwt_required()
+def get_bulk_job_results(job_id):
+    """Return one page of a finished bulk analysis job's results, read from the upload's stored results"""
+    from app import app, bulk_jobs
+    
+    user_id = current_user_id()
+    job = bulk_jobs.get(job_id, user_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if job.status != 'completed':
+        return jsonify({'error': f'Job is {job.status}', 'status': job.status}), 409
+    
+    # the upload may have been pruned since, see BULK_RESULTS_MAX_UPLOADS
+    manifest = load_manifest(app.config['BULK_RESULTS_DIR'], user_id, job.result.get('uploadId'))
+    if manifest is None:
+        return jsonify({'error': 'The results of this job are no longer stored'}), 410
+    
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('perPage', 100, type=int), 1), 1000)
+    total_results = sum(file['analyzedRows'] for file in manifest['files'])
+    
+    return jsonify({
+        'jobId': job.id,
+        'page': page,
+        'perPage': per_page,
+        'totalResults': total_results,
+        'totalPages': (total_results + per_page - 1) // per_page,
+        'results': read_results(app.config['BULK_RESULTS_DIR'], user_id, manifest, (page - 1) * per_page, per_page),
+        'totalAnalyzed': job.result.get('totalAnalyzed', 0),
+        'summary': job.result.get('summary', {}),
+        'uploadId': job.result.get('uploadId'),
+        'fileSummaries': job.result.get('fileSummaries'),
+        'filesProcessed': job.result.get('filesProcessed'),
+        'fileNames': job.result.get('fileNames')
+    })
+
+@analytics.route('/jobs/<job_id>/cancel', methods=['POST'])
+@jwt_required()
+def cancel_bulk_job(job_id):
+    """Cancel a queued or running bulk analysis job"""
+    from app import bulk_jobs
+    
+    user_id = current_user_id()
+    job = bulk_jobs.get(job_id, user_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    job.cancel()
+    return jsonify(job.progress())
+
+@analytics.route('/uploads/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_upload(upload_id):
+    """Describe the stored results of a bulk upload"""
+    from app import app
+    
+    manifest = load_manifest(app.config['BULK_RESULTS_DIR'], current_user_id(), upload_id)
+    if manifest is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(manifest)
+
+@analytics.route('/uploads/<upload_id>/export', methods=['GET'])
+@jwt_required()
+def export_upload(upload_id):
+    """
+    Download one file of a bulk upload with its analysis columns appended.
+    
+    ?file= picks the file by its index in the upload, the first one by default.
+    The file is streamed back as CSV, or with ?format=raw as stored (gzip CSV or Parquet).
+    """
+    from flask import Response, send_file, stream_with_context
+    from werkzeug.utils import secure_filename
+    from app import app
+    
+    user_id = current_user_id()
+    manifest = load_manifest(app.config['BULK_RESULTS_DIR'], user_id, upload_id)
+    if manifest is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    
+    file_index = request.args.get('file', 0, type=int)
+    if not 0 <= file_index < len(manifest['files']):
+        return jsonify({'error': 'Invalid file index'}), 400
+    if not manifest['files'][file_index]['stored']:
+        return jsonify({'error': 'No comments were found in this file'}), 404
+    
+    name = os.path.splitext(secure_filename(manifest['files'][file_index]['fileName']))[0] or 'upload'
+    
+    if request.args.get('format') == 'raw':
+        return send_file(
+            stored_file_path(app.config['BULK_RESULTS_DIR'], user_id, manifest, file_index),
+            as_attachment=True,
+            download_name=f"{name}_analyzed.{manifest['format']}"
+        )
+    
+    return Response(
+        stream_with_context(iter_csv(app.config['BULK_RESULTS_DIR'], user_id, manifest, file_index)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{name}_analyzed.csv"'}
+    )
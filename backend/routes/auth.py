@@ -2,11 +2,11 @@ from flask import Blueprint, request, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 import jwt
-import sqlite3
 import datetime
 import re
 import logging
-import os
+from db import get_db
+from identity import identity_claims, invalidate as invalidate_identity
 
 # configure logging
 logging.basicConfig(level=logging.ERROR)
@@ -16,17 +16,6 @@ logger = logging.getLogger(__name__)
 
 auth = Blueprint('auth', __name__)
 
-def get_db():
-    try:
-        db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database.db')
-
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-    except Exception as e:
-        logger.error(f"Database connection error: {e}")
-        raise
-
 def validate_email(email):
     """Validate email format using regex"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -58,36 +47,6 @@ def decode_token(token):
         logger.error(f"Token decode error: {e}")
         return None
 
-# test database connection and table structure
-def test_database():
-    try:
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        # check if users table exists and get its structure
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
-        table_exists = cursor.fetchone()
-        
-        if table_exists:
-            cursor.execute("PRAGMA table_info(users)")
-            columns = cursor.fetchall()
-                
-            # count existing users
-            cursor.execute("SELECT COUNT(*) FROM users")
-            user_count = cursor.fetchone()[0]
-        else:
-            logger.error("Users table does not exist!")
-            
-        conn.close()
-        return True
-    except Exception as e:
-        logger.error(f"Database test failed: {e}")
-        return False
-
-# initialize database test
-if test_database():
-    pass
-
 @auth.route('/test', methods=['GET'])
 def test_route():
     """Test route to verify auth blueprint is working"""
@@ -151,8 +110,11 @@ def register():
             )
             conn.commit()
             
-            # create access token
-            access_token = create_access_token(identity=email)
+            # create access token, the user id claim saves later requests a lookup
+            access_token = create_access_token(
+                identity=email,
+                additional_claims=identity_claims(cursor.lastrowid)
+            )
     
             
             return jsonify({
@@ -204,7 +166,10 @@ def login():
                 logger.error(f"Invalid password for user: {email}")
                 return jsonify({"error": "Invalid email or password"}), 401
                 
-            access_token = create_access_token(identity=email)
+            access_token = create_access_token(
+                identity=email,
+                additional_claims=identity_claims(user['id'])
+            )
     
             
             return jsonify({
@@ -338,6 +303,10 @@ def update_profile():
                 query = f"UPDATE users SET {', '.join(update_fields)} WHERE email = ?"
                 cursor.execute(query, update_values)
                 conn.commit()
+                
+                # the old email must no longer resolve to this user
+                if 'email' in data:
+                    invalidate_identity(current_user_email)
         
             
             # get updated user data
@@ -1,10 +1,11 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import logging
-import sqlite3
-import os
-import json
+from db import get_db
 from datetime import datetime
+from identity import current_user_id
+from pagination import get_page_args, paginated_response
+from routes.profile import add_profile_activity
 
 # configure logging
 logging.basicConfig(level=logging.ERROR)
@@ -12,17 +13,6 @@ logger = logging.getLogger(__name__)
 
 notes = Blueprint('notes', __name__)
 
-def get_db():
-    try:
-        db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database.db')
-
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-    except Exception as e:
-        logger.error(f"Database connection error: {e}")
-        raise
-
 def init_db():
     try:
         conn = get_db()
@@ -39,7 +29,7 @@ def init_db():
                 FOREIGN KEY (user_id) REFERENCES users (id)
             )
         ''')
-        conn.commit()
+        # committed by the migration running this, see init_db.migrate
     
     except Exception as e:
         logger.error(f"Database initialization error: {e}")
@@ -51,30 +41,40 @@ def init_db():
 @jwt_required()
 def get_notes():
     try:
-        current_user = get_jwt_identity()
-    
         conn = get_db()
         cursor = conn.cursor()
         
-        # get user ID from email
-        user = cursor.execute(
-            "SELECT id FROM users WHERE email = ?",
-            (current_user,)
-        ).fetchone()
+        # get user ID from the token
+        user_id = current_user_id()
         
-        if not user:
-            logger.error(f"User not found: {current_user}")
+        if user_id is None:
+            logger.error(f"User not found: {get_jwt_identity()}")
             return jsonify({"error": "User not found"}), 404
             
-        # get notes data
-        notes = cursor.execute(
-            "SELECT id, content, created_at, updated_at FROM notes WHERE user_id = ? ORDER BY created_at DESC",
-            (user['id'],)
-        ).fetchall()
+        try:
+            limit, after = get_page_args(default_limit=50, max_limit=200)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # get one page of notes, newest first, starting after the cursor
+        if after:
+            notes = cursor.execute(
+                """SELECT id, content, created_at, updated_at FROM notes
+                   WHERE user_id = ? AND (created_at < ? OR (created_at = ? AND id < ?))
+                   ORDER BY created_at DESC, id DESC LIMIT ?""",
+                (user_id, after[0], after[0], after[1], limit + 1)
+            ).fetchall()
+        else:
+            notes = cursor.execute(
+                """SELECT id, content, created_at, updated_at FROM notes
+                   WHERE user_id = ?
+                   ORDER BY created_at DESC, id DESC LIMIT ?""",
+                (user_id, limit + 1)
+            ).fetchall()
         
         # convert to list of dicts
         notes_list = []
-        for note in notes:
+        for note in notes[:limit]:
             notes_list.append({
                 'id': note['id'],
                 'content': note['content'],
@@ -82,7 +82,11 @@ def get_notes():
                 'updatedAt': note['updated_at']
             })
         
-        return jsonify(notes_list)
+        # the cursor for the next page goes in a header so the body stays a plain list
+        return paginated_response(
+            jsonify(notes_list), notes, limit,
+            lambda note: (note['created_at'], note['id'])
+        )
         
     except Exception as e:
         logger.error(f"Error getting notes: {e}")
@@ -94,7 +98,6 @@ def get_notes():
 @jwt_required()
 def create_note():
     try:
-        current_user = get_jwt_identity()
         data = request.get_json()
         
         if not data or 'content' not in data:
@@ -103,77 +106,29 @@ def create_note():
         conn = get_db()
         cursor = conn.cursor()
         
-        # get user ID from email
-        user = cursor.execute(
-            "SELECT id FROM users WHERE email = ?",
-            (current_user,)
-        ).fetchone()
+        # get user ID from the token
+        user_id = current_user_id()
         
-        if not user:
+        if user_id is None:
             return jsonify({"error": "User not found"}), 404
             
         # create note
         now = datetime.now().isoformat()
         cursor.execute(
             "INSERT INTO notes (user_id, content, created_at) VALUES (?, ?, ?)",
-            (user['id'], data['content'], now)
+            (user_id, data['content'], now)
         )
-        conn.commit()
         
         # get the ID of the new note
         note_id = cursor.lastrowid
         
-        # update user's stats to increment the notes count
+        # count the note on the profile and add it to the recent activity
         cursor.execute(
-            "SELECT stats FROM profiles WHERE user_id = ?",
-            (user['id'],)
+            "UPDATE profiles SET note_count = note_count + 1 WHERE user_id = ?",
+            (user_id,)
         )
-        stats_row = cursor.fetchone()
-        
-        if stats_row and stats_row['stats']:
-            try:
-                stats = json.loads(stats_row['stats'])
-                if isinstance(stats, dict):
-                    # Increment followers which we're using for notes count
-                    stats['followers'] = stats.get('followers', 0) + 1
-                    
-                    cursor.execute(
-                        "UPDATE profiles SET stats = ? WHERE user_id = ?",
-                        (json.dumps(stats), user['id'])
-                    )
-                    conn.commit()
-            except json.JSONDecodeError:
-                logger.error(f"Error decoding stats JSON for user {user['id']}")
-        
-        # add to recent activity
-        cursor.execute(
-            "SELECT recent_activity FROM profiles WHERE user_id = ?",
-            (user['id'],)
-        )
-        activity_row = cursor.fetchone()
-        
-        if activity_row and activity_row['recent_activity']:
-            try:
-                activities = json.loads(activity_row['recent_activity'])
-                if isinstance(activities, list):
-                    # add new activity
-                    new_activity = {
-                        'description': f"Added a new note",
-                        'time': now
-                    }
-                    activities.insert(0, new_activity)
-                    
-                    # keep only the most recent 10 activities
-                    if len(activities) > 10:
-                        activities = activities[:10]
-                    
-                    cursor.execute(
-                        "UPDATE profiles SET recent_activity = ? WHERE user_id = ?",
-                        (json.dumps(activities), user['id'])
-                    )
-                    conn.commit()
-            except json.JSONDecodeError:
-                logger.error(f"Error decoding recent_activity JSON for user {user['id']}")
+        add_profile_activity(cursor, user_id, "Added a new note", now)
+        conn.commit()
         
         return jsonify({
             "id": note_id,
@@ -192,7 +147,6 @@ def create_note():
 @jwt_required()
 def update_note(note_id):
     try:
-        current_user = get_jwt_identity()
         data = request.get_json()
         
         if not data or 'content' not in data:
@@ -201,19 +155,16 @@ def update_note(note_id):
         conn = get_db()
         cursor = conn.cursor()
         
-        # get user ID from email
-        user = cursor.execute(
-            "SELECT id FROM users WHERE email = ?",
-            (current_user,)
-        ).fetchone()
+        # get user ID from the token
+        user_id = current_user_id()
         
-        if not user:
+        if user_id is None:
             return jsonify({"error": "User not found"}), 404
             
         # check if note exists and belongs to user
         note = cursor.execute(
             "SELECT id FROM notes WHERE id = ? AND user_id = ?",
-            (note_id, user['id'])
+            (note_id, user_id)
         ).fetchone()
         
         if not note:
@@ -243,23 +194,19 @@ def update_note(note_id):
 @jwt_required()
 def delete_note(note_id):
     try:
-        current_user = get_jwt_identity()
         conn = get_db()
         cursor = conn.cursor()
         
-        # get user ID from email
-        user = cursor.execute(
-            "SELECT id FROM users WHERE email = ?",
-            (current_user,)
-        ).fetchone()
+        # get user ID from the token
+        user_id = current_user_id()
         
-        if not user:
+        if user_id is None:
             return jsonify({"error": "User not found"}), 404
             
         # check if note exists and belongs to user
         note = cursor.execute(
             "SELECT id FROM notes WHERE id = ? AND user_id = ?",
-            (note_id, user['id'])
+            (note_id, user_id)
         ).fetchone()
         
         if not note:
@@ -270,29 +217,13 @@ def delete_note(note_id):
             "DELETE FROM notes WHERE id = ?",
             (note_id,)
         )
-        conn.commit()
         
         # update user's stats to decrement the notes count
         cursor.execute(
-            "SELECT stats FROM profiles WHERE user_id = ?",
-            (user['id'],)
+            "UPDATE profiles SET note_count = note_count - 1 WHERE user_id = ? AND note_count > 0",
+            (user_id,)
         )
-        stats_row = cursor.fetchone()
-        
-        if stats_row and stats_row['stats']:
-            try:
-                stats = json.loads(stats_row['stats'])
-                if isinstance(stats, dict) and stats.get('followers', 0) > 0:
-                    # Decrement followers which we're using for notes count
-                    stats['followers'] = stats.get('followers', 0) - 1
-                    
-                    cursor.execute(
-                        "UPDATE profiles SET stats = ? WHERE user_id = ?",
-                        (json.dumps(stats), user['id'])
-                    )
-                    conn.commit()
-            except json.JSONDecodeError:
-                logger.error(f"Error decoding stats JSON for user {user['id']}")
+        conn.commit()
         
         return jsonify({"message": "Note deleted successfully"})
         
@@ -301,6 +232,3 @@ def delete_note(note_id):
         return jsonify({"error": str(e)}), 500
     finally:
         conn.close()
-
-# initialize the database when the module is imported
-init_db()
@@ -1,8 +1,11 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 import logging
-import sqlite3
-import os
+import json
+from datetime import datetime
+from db import get_db
+from identity import current_user_id
+from init_db import parse_stored_value
 
 # configure logging
 logging.basicConfig(level=logging.ERROR)
@@ -10,16 +13,21 @@ logger = logging.getLogger(__name__)
 
 profile = Blueprint('profile', __name__)
 
-def get_db():
-    try:
-        db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database.db')
+# recent activities shown on the profile, older ones are deleted as new ones come in
+RECENT_ACTIVITY_LIMIT = 10
 
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
-    except Exception as e:
-        logger.error(f"Database connection error: {e}")
-        raise
+def add_profile_activity(cursor, user_id, description, created_at):
+    """Add an activity to the users profile and drop the ones past RECENT_ACTIVITY_LIMIT"""
+    cursor.execute(
+        "INSERT INTO profile_activity (user_id, description, created_at) VALUES (?, ?, ?)",
+        (user_id, description, created_at)
+    )
+    cursor.execute(
+        """DELETE FROM profile_activity WHERE user_id = ? AND id <= (
+               SELECT id FROM profile_activity WHERE user_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+           )""",
+        (user_id, user_id, RECENT_ACTIVITY_LIMIT)
+    )
 
 def init_db():
     try:
@@ -41,7 +49,7 @@ def init_db():
                 FOREIGN KEY (user_id) REFERENCES users (id)
             )
         ''')
-        conn.commit()
+        # committed by the migration running this, see init_db.migrate
     
     except Exception as e:
         logger.error(f"Database initialization error: {e}")
@@ -53,28 +61,31 @@ def init_db():
 @jwt_required()
 def get_profile():
     try:
-        current_user = get_jwt_identity()
-    
         conn = get_db()
         cursor = conn.cursor()
         
-        # get user ID from email
-        user = cursor.execute(
-            "SELECT id, name FROM users WHERE email = ?",
-            (current_user,)
-        ).fetchone()
+        # get user ID from the token
+        user_id = current_user_id()
         
-        if not user:
-            logger.error(f"User not found: {current_user}")
+        if user_id is None:
+            logger.error(f"User not found: {get_jwt_identity()}")
             return jsonify({"error": "User not found"}), 404
             
         # get profile data
         profile = cursor.execute(
             "SELECT * FROM profiles WHERE user_id = ?",
-            (user['id'],)
+            (user_id,)
         ).fetchone()
         
         if not profile:
+            user = cursor.execute(
+                "SELECT id, name FROM users WHERE id = ?",
+                (user_id,)
+            ).fetchone()
+            
+            if not user:
+                logger.error(f"User not found: {get_jwt_identity()}")
+                return jsonify({"error": "User not found"}), 404
     
             # create default profile if none exists
             default_profile = {
@@ -97,17 +108,36 @@ def get_profile():
                 ]
             }
             
+            # notes written before the profile existed still count
+            note_count = cursor.execute(
+                "SELECT COUNT(*) FROM notes WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()[0]
+            default_profile['stats']['followers'] = note_count
+            
             cursor.execute(
                 """INSERT INTO profiles 
-                   (user_id, name, title, location, bio, avatar_url, cover_url, stats, recent_activity) 
+                   (user_id, name, title, location, bio, avatar_url, cover_url, stats, note_count) 
                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
                 (user['id'], default_profile['name'], default_profile['title'],
                  default_profile['location'], default_profile['bio'],
                  default_profile['avatar_url'], default_profile['cover_url'],
-                 str(default_profile['stats']), str(default_profile['recentActivity']))
+                 json.dumps(default_profile['stats']), note_count)
             )
+            add_profile_activity(cursor, user['id'], 'Joined Sunsights', datetime.now().isoformat())
             conn.commit()
             return jsonify(default_profile)
+        
+        # followers is used for the notes count
+        stats = parse_stored_value(profile['stats'])
+        if not isinstance(stats, dict):
+            stats = {}
+        stats['followers'] = profile['note_count']
+        
+        activities = cursor.execute(
+            "SELECT description, created_at FROM profile_activity WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, RECENT_ACTIVITY_LIMIT)
+        ).fetchall()
             
         # return existing profile
         return jsonify({
@@ -117,8 +147,11 @@ def get_profile():
             'bio': profile['bio'],
             'avatar_url': profile['avatar_url'],
             'cover_url': profile['cover_url'],
-            'stats': profile['stats'],
-            'recentActivity': profile['recent_activity']
+            'stats': stats,
+            'recentActivity': [
+                {'description': activity['description'], 'time': activity['created_at']}
+                for activity in activities
+            ]
         })
         
     except Exception as e:
@@ -131,7 +164,6 @@ def get_profile():
 @jwt_required()
 def update_profile():
     try:
-        current_user = get_jwt_identity()
         data = request.get_json()
         
         if not data:
@@ -140,24 +172,21 @@ def update_profile():
         conn = get_db()
         cursor = conn.cursor()
         
-        # get user ID from email
-        user = cursor.execute(
-            "SELECT id FROM users WHERE email = ?",
-            (current_user,)
-        ).fetchone()
+        # get user ID from the token
+        user_id = current_user_id()
         
-        if not user:
+        if user_id is None:
             return jsonify({"error": "User not found"}), 404
             
-        # update profile
+        # update profile, the note count and recent activity are kept by the server
         cursor.execute(
             """UPDATE profiles 
                SET name = ?, title = ?, location = ?, bio = ?, 
-                   avatar_url = ?, cover_url = ?, stats = ?, recent_activity = ?
+                   avatar_url = ?, cover_url = ?, stats = ?
                WHERE user_id = ?""",
             (data.get('name'), data.get('title'), data.get('location'),
              data.get('bio'), data.get('avatar_url'), data.get('cover_url'),
-             str(data.get('stats')), str(data.get('recentActivity')), user['id'])
+             json.dumps(data.get('stats')), user_id)
         )
         conn.commit()
         
@@ -168,6 +197,3 @@ def update_profile():
         return jsonify({"error": str(e)}), 500
     finally:
         conn.close()
-
-# initialize the database when the module is imported
-init_db()
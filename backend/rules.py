@@ -0,0 +1,216 @@
+"""
+Precompiled phrase matching for the rule-based part of the text analysis.
+
+All the phrase lists used by the rules are compiled once at import time into
+a single regex, so a text is scanned in one pass and comes back as an integer
+bitset of the rule features it matched. The decision tree in app.apply_rules
+only looks at these bits.
+"""
+import re
+from bisect import bisect_right
+from itertools import accumulate
+
+# bump whenever the phrases or the decision tree change so cached results are dropped
+RULES_VERSION = 1
+
+# feature bits
+NEGATIVE = 1 << 0
+POSITIVE = 1 << 1
+DOUBLE_NEGATIVE = 1 << 2
+SURPRISE = 1 << 3
+LOVE = 1 << 4
+ANGER = 1 << 5
+EXCLAMATION = 1 << 6
+FUNCTIONALITY_ISSUE = 1 << 7
+SADNESS = 1 << 8
+MIXED = 1 << 9
+BUT = 1 << 10
+HATE = 1 << 11
+SAD_WORDS = 1 << 12
+FEAR_WORDS = 1 << 13
+NOT_JOY = 1 << 14
+MIXED_JOY = 1 << 15
+MIXED_SADNESS = 1 << 16
+WORRY = 1 << 17
+DISAPPOINTED = 1 << 18
+HATE_FURIOUS = 1 << 19
+NEGATIVE_JOY = 1 << 20
+CONCERN = 1 << 21
+
+# phrases that set each feature bit, matched as substrings of the lowercased text
+RULE_PHRASES = {
+    # direct negative phrases
+    NEGATIVE: [
+        'not good', 'not great', 'bad', 'terrible', 'awful', 'poor', 'horrible',
+        'disappointing', 'worse', 'worst', 'could be better', 'needs improvement',
+        'should improve', 'not happy', 'not satisfied', 'dislike', 'hate',
+        'frustrated', 'annoyed', 'angry', 'upset', 'sad', 'unhappy'
+    ],
+    # direct positive phrases
+    POSITIVE: [
+        'good', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic', 'outstanding',
+        'exceptional', 'perfect', 'brilliant', 'superb', 'happy', 'glad', 'pleased',
+        'delighted', 'satisfied', 'enjoy', 'love', 'like', 'appreciate'
+    ],
+    # double negatives (which are actually positive)
+    DOUBLE_NEGATIVE: [
+        'not bad', "isn't bad", "aren't bad", "wasn't bad", "weren't bad",
+        'not terrible', "isn't terrible", 'not awful', "isn't awful",
+        'not the worst', "isn't the worst"
+    ],
+    # expressions of surprise
+    SURPRISE: [
+        "wow", "didn't expect", "unexpected", "surprised", "amazing results",
+        "can't believe", "incredible", "unbelievable", "astonishing"
+    ],
+    # expressions of love
+    LOVE: [
+        "adore", "love", "can't live without", "obsessed with", "favorite",
+        "best ever", "absolutely love", "absolutely adore"
+    ],
+    # expressions of anger
+    ANGER: [
+        "furious", "angry", "mad", "outraged", "terrible service", "awful service",
+        "horrible service", "unacceptable", "ridiculous", "infuriating", "frustrated",
+        "annoyed", "irritated", "upset", "appalling", "terrible", "horrible", "awful",
+        "worst", "hate", "disgusting", "pathetic", "useless", "waste", "poor service",
+        "bad service", "poor quality", "bad quality",
+        "complaint", "complain", "unsatisfied", "dissatisfied", "not happy", "unhappy",
+        "never again", "never use", "never buy", "never shop", "never return", "never recommend"
+    ],
+    EXCLAMATION: ["!"],
+    # functionality issues (these should be high priority)
+    FUNCTIONALITY_ISSUE: [
+        "doesn't work", "does not work", "not working", "broken", "malfunction",
+        "error", "bug", "glitch", "crash", "freezes", "hangs", "stuck",
+        "failed", "failure", "unusable", "can't use", "cannot use",
+        "not as advertised", "doesn't work as advertised", "does not work as advertised",
+        "false advertising", "misleading", "misrepresented", "not as described",
+        "not what I expected", "not what was promised", "promised", "advertised"
+    ],
+    # expressions of sadness/disappointment
+    SADNESS: [
+        "disappointed", "disappointing", "disappointment", "sad", "unhappy", "regret", "let down", "letdown",
+        "not as expected", "not what i expected", "dissatisfied", "unsatisfied"
+    ],
+    # mixed sentiment expressions
+    MIXED: [
+        "mixed feelings", "pros and cons", "good and bad", "like and dislike",
+        "partly", "somewhat", "kind of", "sort of", "not sure if", "conflicted",
+        "on one hand", "on the other hand", "however", "although", "but",
+        "nevertheless", "nonetheless", "despite", "in spite of", "while", "whereas",
+        "concerned", "concern", "worried", "worry", "issue", "issues", "problem",
+        "problems", "drawback", "drawbacks", "downside", "downsides"
+    ],
+    BUT: ["but"],
+    # keyword overrides used inside the decision tree
+    HATE: ["hate"],
+    SAD_WORDS: ["disappointed", "let down", "sad"],
+    FEAR_WORDS: ["worried", "worry", "won't work"],
+    NOT_JOY: ['not good', 'not great', 'not bad but', 'bad', 'awful', 'terrible', 'horrible'],
+    MIXED_JOY: ['but overall good', 'but i like'],
+    MIXED_SADNESS: ['but overall bad', 'but i dislike', 'concern', 'worried', 'issue', 'problem'],
+    WORRY: ['worried', 'worry'],
+    DISAPPOINTED: ['disappointed', 'let down'],
+    HATE_FURIOUS: ['hate', 'furious'],
+    NEGATIVE_JOY: ['not good', 'bad', 'awful', 'terrible', 'horrible'],
+    CONCERN: [
+        "concern", "concerned", "worry", "worried", "issue", "issues", "problem", "problems",
+        "reliability", "unreliable"
+    ],
+}
+
+def _build_phrase_bits(rule_phrases):
+    """Map every phrase to the OR of the feature bits it belongs to."""
+    phrase_bits = {}
+    for bit, phrases in rule_phrases.items():
+        for phrase in phrases:
+            phrase_bits[phrase] = phrase_bits.get(phrase, 0) | bit
+    return phrase_bits
+
+def _build_match_bits(phrase_bits):
+    """
+    Give each phrase the bits of every phrase that is a prefix of it.
+
+    The scanner only reports the longest phrase starting at a position, and
+    any shorter phrase that is a prefix of it matched there as well.
+    """
+    match_bits = {}
+    for phrase in phrase_bits:
+        bits = 0
+        for prefix, prefix_bits in phrase_bits.items():
+            if phrase.startswith(prefix):
+                bits |= prefix_bits
+        match_bits[phrase] = bits
+    return match_bits
+
+def _build_trie_pattern(phrases):
+    """
+    Build a regex alternation of the phrases factored into a prefix trie.
+
+    At each trie node the longer continuations are tried first, so the regex
+    returns the longest phrase that starts at a given position.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def node_pattern(node):
+        branches = [re.escape(char) + node_pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            body = '(?:' + body + ')?'
+        return body
+
+    return node_pattern(trie)
+
+_PHRASE_BITS = _build_phrase_bits(RULE_PHRASES)
+_MATCH_BITS = _build_match_bits(_PHRASE_BITS)
+
+# zero-width lookahead so overlapping phrases at every position are found
+_PHRASE_PATTERN = re.compile('(?=(' + _build_trie_pattern(_PHRASE_BITS) + '))')
+
+def extract_features(text):
+    """
+    Scan one text for every rule phrase.
+
+    Args:
+        text (str): The text to scan
+
+    Returns:
+        int: Bitset of the feature flags defined in this module
+    """
+    features = 0
+    for match in _PHRASE_PATTERN.finditer(text.lower()):
+        features |= _MATCH_BITS[match.group(1)]
+    return features
+
+def extract_features_batch(texts):
+    """
+    Scan many texts for every rule phrase in a single regex pass.
+
+    The lowercased texts are joined with a separator no phrase contains and
+    scanned once, then each match is mapped back to its text by offset.
+
+    Args:
+        texts (list or pandas.Series): The texts to scan
+
+    Returns:
+        list or pandas.Series: One feature bitset per text, a Series keeps the input index
+    """
+    lowered = [text.lower() for text in texts]
+    starts = [0] + list(accumulate(len(text) + 1 for text in lowered))
+    features = [0] * len(lowered)
+
+    for match in _PHRASE_PATTERN.finditer('\0'.join(lowered)):
+        index = bisect_right(starts, match.start()) - 1
+        features[index] |= _MATCH_BITS[match.group(1)]
+
+    if hasattr(texts, 'iloc'):
+        return type(texts)(features, index=texts.index)
+    return features
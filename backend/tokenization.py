@@ -0,0 +1,101 @@
+"""
+Length-aware tokenization policy for model inference.
+
+Texts are tokenized once without padding, texts longer than the models'
+input are cut down by a truncation policy, and the pieces are sorted by
+length before batching so each batch holds texts of similar length and
+little compute goes to padding. Model latency is tracked per length bucket.
+
+Truncation policies:
+    head            keep the first tokens, what the pipelines do with truncation=True
+    head+tail       keep the first head_tokens and fill the rest from the end of
+                    the text, long reviews often end with the verdict
+    sliding-window  split the text into overlapping windows, the models'
+                    probabilities are averaged over the windows
+"""
+import threading
+
+from batching import size_bucket
+
+TRUNCATION_POLICIES = ('head', 'head+tail', 'sliding-window')
+
+class TokenizationPolicy:
+    def __init__(self, truncation='head+tail', max_length=512, head_tokens=128, window_stride=256, sort_by_length=True):
+        """
+        Args:
+            truncation (str): One of TRUNCATION_POLICIES
+            max_length (int): Most tokens per model input, special tokens included
+            head_tokens (int): Tokens kept from the start of a text with head+tail
+            window_stride (int): Tokens between the starts of sliding windows
+            sort_by_length (bool): Batch texts of similar length together
+        """
+        if truncation not in TRUNCATION_POLICIES:
+            raise ValueError(f"Unknown truncation policy {truncation!r}, expected one of {TRUNCATION_POLICIES}")
+        self.truncation = truncation
+        self.max_length = max_length
+        self.head_tokens = head_tokens
+        self.window_stride = window_stride
+        self.sort_by_length = sort_by_length
+
+    def split(self, token_ids, length):
+        """
+        Cut a text's token ids into pieces of at most length tokens.
+
+        Returns:
+            list: One list of token ids, or several overlapping ones for sliding-window
+        """
+        if len(token_ids) <= length:
+            return [token_ids]
+
+        if self.truncation == 'head':
+            return [token_ids[:length]]
+
+        if self.truncation == 'head+tail':
+            head = min(self.head_tokens, length)
+            return [token_ids[:head] + token_ids[len(token_ids) - (length - head):]]
+
+        # the last window is moved back to end exactly at the end of the text
+        stride = max(min(self.window_stride, length), 1)
+        starts = list(range(0, len(token_ids) - length, stride)) + [len(token_ids) - length]
+        return [token_ids[start:start + length] for start in starts]
+
+    def order(self, pieces):
+        """Indexes of pieces in the order to batch them"""
+        if not self.sort_by_length:
+            return list(range(len(pieces)))
+        return sorted(range(len(pieces)), key=lambda index: len(pieces[index]))
+
+class LengthBucketStats:
+    """Model latency per padded batch length, bucketed by powers of two."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def record(self, length, texts, seconds):
+        """
+        Args:
+            length (int): Padded token length of the batch
+            texts (int): Inputs in the batch
+            seconds (float): Time both models took on it
+        """
+        bucket = size_bucket(length)
+        with self._lock:
+            entry = self._buckets.setdefault(bucket, {'batches': 0, 'texts': 0, 'seconds': 0.0})
+            entry['batches'] += 1
+            entry['texts'] += texts
+            entry['seconds'] += seconds
+
+    def stats(self):
+        """Return batches, inputs and average latency for each token length bucket."""
+        with self._lock:
+            buckets = sorted(self._buckets.items(), key=lambda entry: int(entry[0].split('-')[0]))
+            return {
+                bucket: {
+                    'batches': entry['batches'],
+                    'texts': entry['texts'],
+                    'averageBatchMs': round(entry['seconds'] / entry['batches'] * 1000, 2),
+                    'msPerText': round(entry['seconds'] / entry['texts'] * 1000, 3)
+                }
+                for bucket, entry in buckets
+            }
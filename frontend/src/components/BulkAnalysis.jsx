@@ -3,10 +3,14 @@ import { CloudArrowUpIcon, DocumentTextIcon, XMarkIcon, CheckCircleIcon } from '
 import axios from '../config/axios';
 import toast from 'react-hot-toast';
 
+// stored results fetched per request once the analysis job has finished
+const RESULTS_PAGE_SIZE = 100;
+const JOB_POLL_INTERVAL_MS = 1000;
+const FINISHED_JOB_STATUSES = ['completed', 'failed', 'cancelled'];
+
 export default function BulkAnalysis() {
   const [files, setFiles] = useState([]);
   const [uploading, setUploading] = useState(false);
-  const [analyzing, setAnalyzing] = useState(false);
   const [results, setResults] = useState(null);
   const [dragActive, setDragActive] = useState(false);
   const [analysisProgress, setAnalysisProgress] = useState(0);
@@ -14,6 +18,11 @@ export default function BulkAnalysis() {
   const [selectedColumns, setSelectedColumns] = useState([]);
   const fileInputRef = useRef(null);
   
+  // background analysis job, its progress is polled until it finishes
+  const [job, setJob] = useState(null);
+  const [cancelling, setCancelling] = useState(false);
+  const [resultsPage, setResultsPage] = useState(0);
+  
 
   
   // filter states for detailed results
@@ -126,12 +135,13 @@ export default function BulkAnalysis() {
       const fileNames = files.map(f => f.name).join(', ');
       
       
-              // add selected columns if csv data exists
+      // the backend analyzes one comment column per file, picked for us when none is selected
       if (csvData && selectedColumns.length > 0) {
-        formData.append('columns', JSON.stringify(selectedColumns));
+        formData.append('column', selectedColumns[0]);
       }
       
-      const endpoint = '/api/analytics/analyze-bulk';
+      // queue the analysis as a background job, its progress is polled below
+      const endpoint = '/api/analytics/analyze/process';
       const response = await axios.post(endpoint, formData, {
         headers: {
           'Content-Type': 'multipart/form-data',
@@ -140,56 +150,111 @@ export default function BulkAnalysis() {
           const percentCompleted = Math.round((progressEvent.loaded * 100) / progressEvent.total);
           setAnalysisProgress(percentCompleted);
         },
-        timeout: 120000 // 2 minutes timeout specifically for bulk analysis
+        timeout: 120000 // 2 minutes timeout for the upload itself
       });
 
-
-      
-      
-      
-      setResults(response.data);
-              // reset filters when new results are loaded
-      setSentimentFilter('All');
-      setEmotionFilter('All');
-      setPriorityFilter('All');
-      toast.success('Files uploaded and analyzed successfully!');
+      setResults(null);
+      setResultsPage(0);
+      setJob(response.data);
     } catch (error) {
 
       toast.error(error.response?.data?.error || 'Failed to upload files');
-    } finally {
       setUploading(false);
       setAnalysisProgress(0);
     }
   };
 
-  const analyzeBulk = async () => {
-    if (!results || !results.uploadedFiles) {
-      toast.error('No files to analyze');
+  // load one page of a finished job's stored results, later pages are appended
+  const loadResultsPage = async (jobId, page) => {
+    const response = await axios.get(`/api/analytics/jobs/${jobId}/results`, {
+      params: { page, perPage: RESULTS_PAGE_SIZE }
+    });
+    setResultsPage(page);
+    setResults(prev => (page === 1 || !prev)
+      ? response.data
+      : { ...response.data, results: [...prev.results, ...response.data.results] });
+  };
+
+  // poll the job until it finishes
+  useEffect(() => {
+    if (!job || FINISHED_JOB_STATUSES.includes(job.status)) {
       return;
     }
 
-    setAnalyzing(true);
-    try {
-      const response = await axios.post('/api/analytics/analyze/process', {
-        fileIds: results.uploadedFiles.map(file => file.id),
-        selectedColumns
-      });
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`/api/analytics/jobs/${job.jobId}`);
+        setJob(response.data);
+      } catch (error) {
+        toast.error(error.response?.data?.error || 'Lost track of the analysis');
+        setJob(null);
+        setUploading(false);
+        setAnalysisProgress(0);
+      }
+    }, JOB_POLL_INTERVAL_MS);
 
-      setResults(prev => ({
-        ...prev,
-        analysis: response.data
-      }));
-      
-      // reset filters and pagination when new data arrives
-      resetFilters();
-      
-      toast.success('Bulk analysis completed!');
+    return () => clearTimeout(timer);
+  }, [job]);
+
+  // once the job finishes, show its results or what went wrong
+  useEffect(() => {
+    if (!job || !FINISHED_JOB_STATUSES.includes(job.status)) {
+      return;
+    }
+
+    const finish = () => {
+      setUploading(false);
+      setCancelling(false);
+      setAnalysisProgress(0);
+    };
+
+    if (job.status === 'completed') {
+      loadResultsPage(job.jobId, 1)
+        .then(() => {
+          // reset filters when new results are loaded
+          setSentimentFilter('All');
+          setEmotionFilter('All');
+          setPriorityFilter('All');
+          setVisibleItems(5);
+          toast.success('Files uploaded and analyzed successfully!');
+        })
+        .catch((error) => {
+          toast.error(error.response?.data?.error || 'Failed to load the analysis results');
+        })
+        .finally(finish);
+    } else if (job.status === 'cancelled') {
+      toast('Analysis cancelled');
+      finish();
+    } else {
+      toast.error(job.error || 'Analysis failed');
+      finish();
+    }
+  }, [job?.jobId, job?.status]);
+
+  const cancelJob = async () => {
+    if (!job) {
+      return;
+    }
+
+    setCancelling(true);
+    try {
+      // a running job stops at its next chunk, polling picks up the cancelled status
+      const response = await axios.post(`/api/analytics/jobs/${job.jobId}/cancel`);
+      setJob(response.data);
     } catch (error) {
+      toast.error(error.response?.data?.error || 'Failed to cancel the analysis');
+      setCancelling(false);
+    }
+  };
 
-      toast.error(error.response?.data?.error || 'Failed to analyze files');
-    } finally {
-      setAnalyzing(false);
+  const formatEta = (seconds) => {
+    if (seconds === null || seconds === undefined) {
+      return null;
     }
+    if (seconds < 60) {
+      return `${Math.ceil(seconds)}s left`;
+    }
+    return `${Math.floor(seconds / 60)}m ${Math.floor(seconds % 60)}s left`;
   };
 
   const getSentimentColor = (sentiment) => {
@@ -272,6 +337,11 @@ export default function BulkAnalysis() {
     return filtered.slice(0, visibleItems);
   };
 
+  // more stored results on the server than loaded so far
+  const hasMorePages = () => {
+    return Boolean(results && job && results.totalPages > resultsPage);
+  };
+
   // load more results automatically
   const loadMoreResults = useCallback(() => {
     if (isLoadingMore) {
@@ -279,17 +349,31 @@ export default function BulkAnalysis() {
     }
     
     setIsLoadingMore(true);
+    
+    // fetch the next page of results once every loaded one is shown
+    if (visibleItems + 5 > getFilteredResults().length && hasMorePages()) {
+      loadResultsPage(job.jobId, resultsPage + 1)
+        .catch((error) => {
+          toast.error(error.response?.data?.error || 'Failed to load more results');
+        })
+        .finally(() => {
+          setVisibleItems(prev => prev + 5);
+          setIsLoadingMore(false);
+        });
+      return;
+    }
+    
     // add a small delay to simulate loading and prevent rapid firing
     setTimeout(() => {
       setVisibleItems(prev => prev + 5);
       setIsLoadingMore(false);
     }, 300);
-  }, [isLoadingMore, visibleItems]);
+  }, [isLoadingMore, visibleItems, results, resultsPage, job]);
 
   // check if there are more results to load
   const hasMoreResults = () => {
     const totalResults = getFilteredResults().length;
-    return totalResults > visibleItems;
+    return totalResults > visibleItems || hasMorePages();
   };
 
   // infinite scroll effect
@@ -367,8 +451,10 @@ export default function BulkAnalysis() {
     setSelectedColumns([]);
     setDragActive(false);
     setUploading(false);
-    setAnalyzing(false);
     setAnalysisProgress(0);
+    setJob(null);
+    setCancelling(false);
+    setResultsPage(0);
     
     // reset filters
     setSentimentFilter('All');
@@ -552,6 +638,38 @@ export default function BulkAnalysis() {
               )}
             </button>
           </div>
+
+          {/* Job Progress */}
+          {job && uploading && (
+            <div className="mt-6 card p-4">
+              <div className="flex items-center justify-between mb-2">
+                <span className="text-sm font-medium text-text">
+                  {job.status === 'queued' ? 'Waiting to start...' : 'Analyzing...'}
+                </span>
+                <button
+                  onClick={cancelJob}
+                  disabled={cancelling}
+                  className="px-3 py-1 text-sm bg-danger/10 hover:bg-danger/20 text-danger rounded-lg transition-colors disabled:opacity-50 disabled:cursor-not-allowed"
+                >
+                  {cancelling ? 'Cancelling...' : 'Cancel'}
+                </button>
+              </div>
+              <div className="w-full h-2 bg-bg-light rounded-full overflow-hidden">
+                <div
+                  className={`h-2 bg-primary rounded-full transition-all duration-300 ${job.percent === null ? 'animate-pulse w-full' : ''}`}
+                  style={job.percent === null ? undefined : { width: `${job.percent}%` }}
+                ></div>
+              </div>
+              <div className="mt-2 flex justify-between text-xs text-text-muted">
+                <span>
+                  {job.totalRows === null
+                    ? `${job.processedRows} rows read`
+                    : `${job.processedRows} of ${job.totalRows} rows (${job.percent}%)`}
+                </span>
+                {formatEta(job.etaSeconds) && <span>{formatEta(job.etaSeconds)}</span>}
+              </div>
+            </div>
+          )}
         </div>
 
         {/* Results Section */}
@@ -630,7 +748,7 @@ export default function BulkAnalysis() {
                   <div className="flex flex-col sm:flex-row sm:items-center sm:justify-between mb-4">
                     <h3 className="text-lg font-medium text-text mb-3 sm:mb-0">Detailed Results</h3>
                     <div className="text-sm text-text-muted">
-                      Showing {getFilteredResults().length} of {results.results.length} results
+                      Showing {getFilteredResults().length} of {results.totalResults ?? results.results.length} results
                     </div>
                   </div>
                   
@@ -45,6 +45,8 @@ export default function Dashboard() {
   // dashboard stats states
   const [stats, setStats] = useState(initialStats);
   const [activities, setActivities] = useState([]);
+  const [activityCursor, setActivityCursor] = useState(null);
+  const [isLoadingMoreActivity, setIsLoadingMoreActivity] = useState(false);
   const [isLoadingStats, setIsLoadingStats] = useState(true);
   const [isLoadingActivity, setIsLoadingActivity] = useState(true);
   const [statsError, setStatsError] = useState(null);
@@ -131,6 +133,8 @@ export default function Dashboard() {
       const response = await axios.get('/api/analytics/activity');
       if (Array.isArray(response.data)) {
         setActivities(response.data);
+        // only the newest page is sent, the header is set when there are older activities
+        setActivityCursor(response.headers['x-next-cursor'] || null);
       } else {
         setActivityError('Invalid activity data format');
       }
@@ -142,6 +146,23 @@ export default function Dashboard() {
     }
   };
 
+  // function to fetch the next page of older activity
+  const fetchMoreActivity = async () => {
+    setIsLoadingMoreActivity(true);
+    
+    try {
+      const response = await axios.get('/api/analytics/activity', { params: { cursor: activityCursor } });
+      if (Array.isArray(response.data)) {
+        setActivities(prev => [...prev, ...response.data]);
+        setActivityCursor(response.headers['x-next-cursor'] || null);
+      }
+    } catch (err) {
+      toast.error('Failed to load more activity');
+    } finally {
+      setIsLoadingMoreActivity(false);
+    }
+  };
+
   // function to handle text analysis
   const handleAnalyzeText = async () => {
     if (!text.trim()) {
@@ -366,6 +387,15 @@ export default function Dashboard() {
                     <p className="text-xs text-text-muted/70">{formatTimestamp(activity.time)}</p>
                   </div>
                 ))}
+                {activityCursor && (
+                  <button
+                    onClick={fetchMoreActivity}
+                    disabled={isLoadingMoreActivity}
+                    className="w-full px-4 py-2 bg-bg-light/50 hover:bg-bg-light text-text rounded-lg transition-colors disabled:opacity-50"
+                  >
+                    {isLoadingMoreActivity ? 'Loading...' : 'Load older activity'}
+                  </button>
+                )}
               </div>
             )}
           </div>
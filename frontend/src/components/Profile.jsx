@@ -24,6 +24,8 @@ export default function Profile() {
   const [notes, setNotes] = useState([]);
   const [newNote, setNewNote] = useState('');
   const [loadingNotes, setLoadingNotes] = useState(false);
+  const [notesCursor, setNotesCursor] = useState(null);
+  const [loadingMoreNotes, setLoadingMoreNotes] = useState(false);
   const [addingNote, setAddingNote] = useState(false);
 
   useEffect(() => {
@@ -60,6 +62,8 @@ export default function Profile() {
     try {
       const response = await axios.get('/api/notes');
       setNotes(response.data || []);
+      // the server sends notes a page at a time, the header is only set when there are older ones
+      setNotesCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
 
       toast.error('Failed to load notes');
@@ -68,6 +72,20 @@ export default function Profile() {
     }
   };
 
+  const fetchMoreNotes = async () => {
+    setLoadingMoreNotes(true);
+    try {
+      const response = await axios.get('/api/notes', { params: { cursor: notesCursor } });
+      setNotes(prev => [...prev, ...(response.data || [])]);
+      setNotesCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+
+      toast.error('Failed to load more notes');
+    } finally {
+      setLoadingMoreNotes(false);
+    }
+  };
+
   const handleSave = async () => {
     try {
       const response = await axios.put('/api/auth/profile', formData);
@@ -370,6 +388,15 @@ export default function Profile() {
                   </div>
                 </div>
               ))}
+              {notesCursor && (
+                <button
+                  onClick={fetchMoreNotes}
+                  disabled={loadingMoreNotes}
+                  className="w-full px-4 py-2 bg-bg-light text-text rounded-xl hover:bg-bg-light/80 transition-colors disabled:opacity-50 disabled:cursor-not-allowed"
+                >
+                  {loadingMoreNotes ? 'Loading...' : 'Load older notes'}
+                </button>
+              )}
             </div>
           )}
         </div>
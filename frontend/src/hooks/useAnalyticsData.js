@@ -14,30 +14,19 @@ export default function useAnalyticsData(timeRange = '7d') {
       setError(null);
       
       // use the proper axios instance with authentication
-      const params = { range: timeRange };
+      const params = { timeRange };
       
-      // use Promise.all to fetch all data in parallel
-      const [
-        summaryResponse,
-        sentimentResponse, 
-        emotionsResponse, 
-        priorityResponse, 
-        activityResponse
-      ] = await Promise.all([
-        axios.get(`/api/analytics/summary`, { params }),
-        axios.get(`/api/analytics/sentiment`, { params }),
-        axios.get(`/api/analytics/emotions`, { params }),
-        axios.get(`/api/analytics/priority`, { params }),
-        axios.get(`/api/analytics/activity`, { params })
-      ]);
+      // one request for the whole dashboard, the browser revalidates it with its ETag
+      const response = await axios.get(`/api/analytics/dashboard`, { params });
+      const dashboard = response.data;
 
       // use the actual data from the API instead of hardcoded values
       setData({
-        sentiment: sentimentResponse.data,
-        emotions: emotionsResponse.data,
-        priority: priorityResponse.data,
-        activity: activityResponse.data,
-        summary: summaryResponse.data || {
+        sentiment: dashboard.sentiment,
+        emotions: dashboard.emotions,
+        priority: dashboard.priority,
+        activity: dashboard.activity,
+        summary: dashboard.summary || {
           totalAnalyses: 0,
           averageSentiment: 0,
           responseRate: 0,